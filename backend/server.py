@@ -7,12 +7,13 @@ import logging
 from datetime import datetime, timedelta
 from typing import Optional, List, Dict, Any
 import uuid
-from fastapi import FastAPI, HTTPException, Depends, status, Request
+from fastapi import FastAPI, HTTPException, Depends, status, Request, Response
+from fastapi.encoders import jsonable_encoder
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel, Field
 from motor.motor_asyncio import AsyncIOMotorClient
 from passlib.context import CryptContext
@@ -20,12 +21,34 @@ from jose import JWTError, jwt
 import gspread
 from oauth2client.service_account import ServiceAccountCredentials
 import asyncio
-import requests
+import httpx
 from datetime import datetime
 import pandas as pd
+import numpy as np
 from typing import Union
 import json
+import heapq
+import collections
+import itertools
+import bisect
+import base64
+import hashlib
+import socket
+import tempfile
+import time
+import zlib
+from functools import lru_cache
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from pymongo import ReplaceOne, ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError, OperationFailure
+from bson import ObjectId
+from cachetools import TTLCache
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet ingest is optional
+    pq = None
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -53,16 +76,256 @@ if 'mongodb+srv://' in mongo_url:
 else:
     logger.info(f"Connecting to MongoDB: {mongo_url}")
 
+# Collections rebuilt side by side by full syncs (blue/green)
+GENERATIONAL_COLLECTIONS = ("attendance_logs", "employees", "daily_attendance", "stats_by_dimension")
+GENERATIONS_STATE_ID = "generations"
+GENERATION_REFRESH_SECONDS = float(os.environ.get('GENERATION_REFRESH_SECONDS', '5'))
+
+class GenerationalDatabase:
+    """Motor database wrapper that resolves blue/green collections to their active generation.
+    
+    A full sync builds ``attendance_logs__g<N>`` / ``employees__g<N>`` /
+    ``daily_attendance__g<N>`` next to the live data and then flips a single
+    pointer document in ``sync_state``. ``db.attendance_logs`` and friends
+    always return the active physical collection, so readers never see a
+    half-loaded collection. The
+    previous generation is kept for rollback; other workers pick up the
+    pointer within ``GENERATION_REFRESH_SECONDS``.
+    
+    The same document carries ``data_version``, a counter bumped by every
+    swap, sync and employee write; response caches key on it.
+    """
+    
+    def __init__(self, database):
+        self._db = database
+        self._active = {}
+        self.data_version = 0
+        self._refresh_task = None
+    
+    def __getattr__(self, name):
+        if name in GENERATIONAL_COLLECTIONS:
+            return self._db[self._active.get(name, name)]
+        return getattr(self._db, name)
+    
+    def __getitem__(self, name):
+        return self._db[self._active.get(name, name)]
+    
+    async def _load_generations(self):
+        return await self._db.sync_state.find_one({"_id": GENERATIONS_STATE_ID}) or {}
+    
+    async def refresh_generations(self):
+        """Reload the active generation pointer"""
+        state = await self._load_generations()
+        self._active = dict(state.get("active") or {})
+        self.data_version = state.get("data_version", 0)
+        return state
+    
+    async def bump_data_version(self):
+        """Mark the served data as changed so cached responses are recomputed"""
+        state = await self._db.sync_state.find_one_and_update(
+            {"_id": GENERATIONS_STATE_ID},
+            {"$inc": {"data_version": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        self.data_version = state["data_version"]
+        return self.data_version
+    
+    async def begin_generation(self):
+        """Create empty staging collections for the next generation"""
+        state = await self.refresh_generations()
+        generation = state.get("generation", 0) + 1
+        staging = {}
+        for name in GENERATIONAL_COLLECTIONS:
+            physical = f"{name}__g{generation}"
+            await self._db.drop_collection(physical)  # leftovers of an aborted build
+            staging[name] = self._db[physical]
+        return generation, staging
+    
+    async def activate_generation(self, generation):
+        """Atomically point readers at ``generation`` and drop the one before the previous"""
+        state = await self._load_generations()
+        current = {name: (state.get("active") or {}).get(name, name) for name in GENERATIONAL_COLLECTIONS}
+        active = {name: f"{name}__g{generation}" for name in GENERATIONAL_COLLECTIONS}
+        stale = state.get("previous") or {}
+        
+        state = await self._db.sync_state.find_one_and_update(
+            {"_id": GENERATIONS_STATE_ID},
+            {"$set": {"generation": generation, "active": active, "previous": current, "swapped_at": datetime.now()},
+             "$inc": {"data_version": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        self._active = active
+        # The shared counter, not this worker's possibly stale copy plus one
+        self.data_version = state["data_version"]
+        
+        for physical in stale.values():
+            if physical not in active.values() and physical not in current.values():
+                await self._db.drop_collection(physical)
+        return active
+    
+    async def rollback_generation(self):
+        """Swap the active and previous generations"""
+        state = await self._load_generations()
+        previous = state.get("previous")
+        if not previous:
+            raise ValueError("No previous generation to roll back to")
+        
+        current = {name: (state.get("active") or {}).get(name, name) for name in GENERATIONAL_COLLECTIONS}
+        state = await self._db.sync_state.find_one_and_update(
+            {"_id": GENERATIONS_STATE_ID},
+            {"$set": {"active": previous, "previous": current, "swapped_at": datetime.now()},
+             "$inc": {"data_version": 1}},
+            return_document=ReturnDocument.AFTER
+        )
+        self._active = dict(previous)
+        self.data_version = state["data_version"]
+        return previous
+    
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(GENERATION_REFRESH_SECONDS)
+            try:
+                await self.refresh_generations()
+            except Exception as e:
+                logger.warning(f"Could not refresh collection generations: {e}")
+    
+    def start_refresh(self):
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+    
+    async def stop_refresh(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+
 client = AsyncIOMotorClient(mongo_url)
-db = client[db_name]
+db = GenerationalDatabase(client[db_name])
 
 # JWT Configuration
 SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'employee-management-secret-key-2024')
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 1440  # 24 hours
+USER_CACHE_TTL_SECONDS = float(os.environ.get('USER_CACHE_TTL_SECONDS', '60'))  # bounds staleness across workers
+USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', '1024'))
+
+# Sync ingest configuration
+SYNC_CHUNK_SIZE = int(os.environ.get('SYNC_CHUNK_SIZE', '50000'))  # CSV rows parsed per chunk
+SYNC_BATCH_SIZE = int(os.environ.get('SYNC_BATCH_SIZE', '5000'))  # documents per insert_many
+SYNC_HTTP_TIMEOUT = float(os.environ.get('SYNC_HTTP_TIMEOUT', '60'))  # seconds
+SYNC_HTTP_RETRIES = int(os.environ.get('SYNC_HTTP_RETRIES', '3'))
+SYNC_HTTP_BACKOFF = float(os.environ.get('SYNC_HTTP_BACKOFF', '1.0'))  # seconds, doubled per retry
+SYNC_RETRY_STATUSES = (429, 500, 502, 503, 504)
+SYNC_SPOOL_MAX_BYTES = int(os.environ.get('SYNC_SPOOL_MAX_BYTES', str(16 * 1024 * 1024)))  # spill downloads to disk past this
+GOOGLE_SHEET_CSV_URL = os.environ.get(
+    'GOOGLE_SHEET_CSV_URL',
+    "https://docs.google.com/spreadsheets/d/10rKRL9trrc2QKU5OfGun1A9fpEi0oovZ/export?format=csv&gid=959405682"
+)
+SYNC_MODE = os.environ.get('SYNC_MODE', 'incremental')  # "incremental" or "full"
+SYNC_INTERVAL_MINUTES = float(os.environ.get('SYNC_INTERVAL_MINUTES', '0'))  # 0 disables scheduled syncs
+SYNC_LOCK_TTL_SECONDS = int(os.environ.get('SYNC_LOCK_TTL_SECONDS', '300'))  # lease renewed while a sync runs
+SYNC_LOCK_ID = "google_sheets_sync"
+INITIAL_LOAD_RETRY_SECONDS = float(os.environ.get('INITIAL_LOAD_RETRY_SECONDS', '60'))  # retry a failed first-boot load
+HEALTH_CACHE_SECONDS = float(os.environ.get('HEALTH_CACHE_SECONDS', '5'))  # readiness result reuse window
+HEALTH_DB_TIMEOUT_SECONDS = float(os.environ.get('HEALTH_DB_TIMEOUT_SECONDS', '2'))
+SEARCH_INDEX_MAX_AGE_SECONDS = float(os.environ.get('SEARCH_INDEX_MAX_AGE_SECONDS', '60'))  # picks up other workers' edits
+EMPLOYEE_DIRECTORY_MAX_AGE_SECONDS = float(os.environ.get('EMPLOYEE_DIRECTORY_MAX_AGE_SECONDS', '60'))
+COUNT_CACHE_TTL_SECONDS = float(os.environ.get('COUNT_CACHE_TTL_SECONDS', '30'))  # per-filter total_count reuse
+COUNT_CACHE_SIZE = int(os.environ.get('COUNT_CACHE_SIZE', '1024'))
+COUNT_MODES = ("exact", "estimate", "none")
+DATE_WISE_FORMATS = ("json", "ndjson")
+REPORT_PARTITION_DAYS = int(os.environ.get('REPORT_PARTITION_DAYS', '1'))  # days per range-report partition (7 = weekly)
+REPORT_PARALLELISM = int(os.environ.get('REPORT_PARALLELISM', '4'))  # partitions queried concurrently (and buffered)
+STREAM_RECORDS_PER_CHUNK = int(os.environ.get('STREAM_RECORDS_PER_CHUNK', '200'))  # records per streamed body chunk
+RESPONSE_CACHE_TTL_SECONDS = float(os.environ.get('RESPONSE_CACHE_TTL_SECONDS', '60'))  # also ages time-relative stats
+RESPONSE_CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE', '256'))
+RESPONSE_CACHE_BYPASS_HEADER = "X-Bypass-Cache"  # any value skips the response cache, for debugging
+API_CACHE_CONTROL = os.environ.get('API_CACHE_CONTROL', 'private, no-cache')  # clients revalidate with If-None-Match
+STATS_DIMENSIONS = ("department", "site")  # employee fields with materialized present/absent totals
+
+# Keyset pagination order of the list endpoints (ascending, unique thanks to the last field)
+EMPLOYEE_PAGE_SORT = ("employee_id",)
+SYNCED_EMPLOYEE_FIELDS = ("attendance_status",)  # kept current by incremental syncs; other sheet-derived fields are seeded on insert only
+ATTENDANCE_LOG_PAGE_SORT = ("day", "punch_seconds", "_id")
+SYNC_MODES = ("incremental", "full")
+SYNC_STATE_ID = "google_sheets"  # sync_state document for the sheet source
+SYNC_SOURCE = os.environ.get('SYNC_SOURCE')  # optional default source spec (URL or file path) instead of the sheet
+INGEST_DATA_DIR = Path(os.environ.get('INGEST_DATA_DIR', 'data/ingest')).resolve()  # root for API-triggered file imports
+INGEST_FORMATS = ("csv", "parquet", "ndjson")
+LAST_MODIFIED_FORMAT = "%m/%d/%Y %I:%M:%S %p"
+DOWNLOAD_DATE_FORMAT = "%m/%d/%Y"  # DownloadDate as the sheet (and the API) writes it
+PUNCH_TIME_FORMAT = "%I:%M:%S %p"  # LogDate time of day
+PUNCH_FRAME_COLUMNS = ("user_id", "day", "punch_seconds", "log_date", "c1", "device_id")  # attendance engine input
+PUNCH_TIME_CACHE_SIZE = int(os.environ.get('PUNCH_TIME_CACHE_SIZE', '131072'))  # 86,400 seconds plus spelling variants
+ISO_DAY_FORMAT = "%Y-%m-%d"  # normalized ``day`` field, sorts chronologically
+
+# Sheet column -> (attendance_logs field, type, default)
+SHEET_COLUMNS = {
+    "DeviceLogId": ("device_log_id", str, ""),
+    "DownloadDate": ("download_date", str, ""),
+    "DeviceId": ("device_id", str, ""),
+    "UserId": ("user_id", str, ""),
+    "LogDate": ("log_date", str, ""),
+    "Direction": ("direction", str, ""),
+    "AttDirection": ("att_direction", str, ""),
+    "C1": ("c1", str, ""),
+    "WorkCode": ("work_code", str, ""),
+    "Longitude": ("longitude", str, ""),
+    "Latitude": ("latitude", str, ""),
+    "IsApproved": ("is_approved", int, -1),
+    "CreatedDate": ("created_date", str, ""),
+    "LastModifiedDate": ("last_modified_date", str, ""),
+    "LocationAddress": ("location_address", str, ""),
+    "BodyTemperature": ("body_temperature", float, 0.0),
+    "IsMaskOn": ("is_mask_on", int, 0),
+}
+
+# attendance_logs field -> sheet column, so dumps of the collection can be re-ingested
+SHEET_COLUMN_ALIASES = {field: column for column, (field, _, _) in SHEET_COLUMNS.items()}
+
+# Text layout of date/time columns when a typed source stores them as datetimes
+SHEET_DATETIME_FORMATS = {"DownloadDate": DOWNLOAD_DATE_FORMAT, "LogDate": PUNCH_TIME_FORMAT}
+
+# Collection -> (keys, options) of every index its queries rely on; ensured at startup and on each sync
+INDEX_REGISTRY = {
+    "attendance_logs": [
+        ([("device_log_id", 1)], {}),  # incremental sync diff
+        ([("day", 1), ("punch_seconds", 1), ("_id", 1)], {}),  # date filters and log pages, ordered by time of day
+        ([("user_id", 1), ("day", 1), ("punch_seconds", 1), ("_id", 1)], {}),  # per-employee punches/pages, rollups, distinct user_id
+        ([("device_id", 1), ("day", 1), ("punch_seconds", 1), ("_id", 1)], {}),  # device filter/pages, distinct device_id
+        ([("created_at", 1)], {}),  # recent logs count
+    ],
+    "daily_attendance": [
+        ([("user_id", 1), ("day", 1)], {"unique": True}),
+        ([("day", 1), ("user_id", 1)], {}),
+    ],
+    "employees": [
+        ([("employee_id", 1)], {"unique": True}),
+        ([("id", 1)], {}),  # id half of the id/employee_id $or lookups
+        ([("attendance_status", 1)], {}),
+        ([("department", 1)], {}),
+        ([("site", 1)], {}),
+    ],
+    "stats_by_dimension": [
+        ([("dimension", 1), ("value", 1)], {"unique": True}),
+    ],
+    "users": [
+        ([("username", 1)], {"unique": True}),
+    ],
+    "sync_jobs": [
+        ([("id", 1)], {"unique": True}),
+        ([("status", 1), ("finished_at", -1)], {}),
+    ],
+}
 
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', str(min(4, os.cpu_count() or 1))))
 
 # Security
 security = HTTPBearer()
@@ -91,6 +354,9 @@ class AttendanceLog(BaseModel):
     location_address: str
     body_temperature: float = 0.0
     is_mask_on: int = 0
+    punch_at: Optional[datetime] = None
+    day: Optional[str] = None
+    punch_seconds: Optional[int] = None
     created_at: datetime = Field(default_factory=datetime.now)
     updated_at: datetime = Field(default_factory=datetime.now)
 
@@ -153,6 +419,153 @@ class EmployeeDateWiseData(BaseModel):
     punch_count: int = 0
     all_punches: List[Dict[str, Any]] = []
 
+SYNC_BOOKMARK_FIELDS = ("high_water_mark", "etag", "last_modified", "content_hash")
+
+async def clear_sync_bookmarks(keep: str = None):
+    """Forget every source's bookmarks (but ``keep``'s) once the live data no longer matches them.
+    
+    All sources write into the same collections, so a full ingest or a
+    rollback invalidates the others' high-water marks and content hashes;
+    their next incremental sync then re-diffs everything.
+    """
+    excluded = [GENERATIONS_STATE_ID] + ([keep] if keep else [])
+    await db.sync_state.update_many(
+        {"_id": {"$nin": excluded}},
+        {"$unset": {field: "" for field in SYNC_BOOKMARK_FIELDS}}
+    )
+
+class IngestSource:
+    """A place the sync pipeline can read punch rows from.
+    
+    ``open`` returns a payload dict with ``chunks`` (an iterator of DataFrames
+    laid out like the sheet export: sheet column names, text values),
+    ``bytes``, ``content_hash``, ``etag``, ``last_modified`` and ``close``,
+    or None when the source reports it has not changed.
+    """
+    kind = "source"
+    
+    @property
+    def state_id(self):
+        """sync_state document holding this source's bookmarks"""
+        return f"{self.kind}:{self.describe()}"
+    
+    def describe(self):
+        raise NotImplementedError
+    
+    async def open(self, sync_state, conditional, chunk_size):
+        raise NotImplementedError
+
+class GoogleSheetSource(IngestSource):
+    """The Google Sheets CSV export, fetched over HTTP"""
+    kind = "google_sheet"
+    
+    def __init__(self, service, url):
+        self.service = service
+        self.url = url
+    
+    @property
+    def state_id(self):
+        return SYNC_STATE_ID
+    
+    def describe(self):
+        return self.url
+    
+    async def open(self, sync_state, conditional, chunk_size):
+        download = await self.service._download_sheet(self.url, sync_state, conditional=conditional)
+        if download is None:
+            return None
+        
+        # Reading everything as text keeps column types stable across chunks
+        download["chunks"] = iter(pd.read_csv(download["file"], chunksize=chunk_size, dtype=str, keep_default_na=False))
+        download["close"] = download.pop("file").close
+        return download
+
+class FileIngestSource(IngestSource):
+    """A local export on disk. Changes are detected from its size and mtime."""
+    
+    def __init__(self, path):
+        self.path = Path(path).resolve()
+    
+    def describe(self):
+        return str(self.path)
+    
+    def _read_chunks(self, chunk_size):
+        raise NotImplementedError
+    
+    async def open(self, sync_state, conditional, chunk_size):
+        stat = await asyncio.to_thread(self.path.stat)
+        fingerprint = hashlib.sha256(f"{self.path}:{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()
+        return {
+            "chunks": self._read_chunks(chunk_size),
+            "bytes": stat.st_size,
+            "content_hash": fingerprint,
+            "etag": None,
+            "last_modified": None,
+            "close": lambda: None
+        }
+
+class CsvFileSource(FileIngestSource):
+    kind = "csv"
+    
+    def _read_chunks(self, chunk_size):
+        reader = pd.read_csv(self.path, chunksize=chunk_size, dtype=str, keep_default_na=False)
+        return (chunk.rename(columns=_column_renames(chunk)) for chunk in reader)
+
+class ParquetFileSource(FileIngestSource):
+    kind = "parquet"
+    
+    def _read_chunks(self, chunk_size):
+        if pq is None:
+            raise RuntimeError("Parquet ingest requires pyarrow (pip install pyarrow)")
+        parquet_file = pq.ParquetFile(self.path)
+        return (_normalize_source_chunk(batch.to_pandas()) for batch in parquet_file.iter_batches(batch_size=chunk_size))
+
+class NdjsonFileSource(FileIngestSource):
+    kind = "ndjson"
+    
+    def _read_chunks(self, chunk_size):
+        reader = pd.read_json(self.path, lines=True, chunksize=chunk_size, dtype=False, convert_dates=False)
+        return (_normalize_source_chunk(chunk) for chunk in reader)
+
+FILE_SOURCES = {"csv": CsvFileSource, "parquet": ParquetFileSource, "ndjson": NdjsonFileSource}
+FILE_EXTENSIONS = {".csv": "csv", ".parquet": "parquet", ".pq": "parquet", ".ndjson": "ndjson", ".jsonl": "ndjson", ".json": "ndjson"}
+
+def _column_renames(chunk):
+    """Map attendance_logs field names in a chunk back to sheet column names"""
+    return {
+        field: column for field, column in SHEET_COLUMN_ALIASES.items()
+        if field in chunk.columns and column not in chunk.columns
+    }
+
+def _normalize_source_chunk(chunk):
+    """Coerce a chunk from a typed source (Parquet, NDJSON) into the sheet's text layout"""
+    chunk = chunk.rename(columns=_column_renames(chunk))
+    normalized = pd.DataFrame(index=chunk.index)
+    for column in chunk.columns:
+        if column not in SHEET_COLUMNS:
+            continue
+        
+        series = chunk[column]
+        if pd.api.types.is_datetime64_any_dtype(series):
+            text = series.dt.strftime(SHEET_DATETIME_FORMATS.get(column, LAST_MODIFIED_FORMAT))
+        elif pd.api.types.is_float_dtype(series) and (series.dropna() % 1 == 0).all():
+            # Integer columns with gaps come back as floats; avoid "22.0"
+            text = series.astype("Int64").astype(str)
+        else:
+            text = series.astype(str)
+        normalized[column] = text.where(series.notna(), "")
+    return normalized
+
+def build_ingest_source(spec: str, service=None, fmt: str = None):
+    """Create a source from a URL or a file path (format from ``fmt`` or the extension)"""
+    if spec.startswith(("http://", "https://")):
+        return GoogleSheetSource(service or sheets_service, spec)
+    
+    fmt = fmt or FILE_EXTENSIONS.get(Path(spec).suffix.lower())
+    if fmt not in FILE_SOURCES:
+        raise ValueError(f"Cannot tell the format of {spec}; use one of: {', '.join(INGEST_FORMATS)}")
+    return FILE_SOURCES[fmt](spec)
+
 class GoogleSheetsService:
     def __init__(self):
         self.SHEET_URL = 'https://docs.google.com/spreadsheets/d/1RsS1Au7Hohuv_it26bica50jVcZVz9qS/edit?usp=drive_link&ouid=104161559924052207884&rtpof=true&sd=true'
@@ -174,6 +587,37 @@ class GoogleSheetsService:
             "33": "Branch L",
             "34": "Branch M"
         }
+        self.csv_url = GOOGLE_SHEET_CSV_URL
+        self.chunk_size = SYNC_CHUNK_SIZE
+        self.batch_size = SYNC_BATCH_SIZE
+        self._http_client = None
+    
+    def _daily_attendance(self, punches):
+        """Yield ``(user_id, day, attendance, total_hours)`` for every (user, day) of a punch frame.
+        
+        ``attendance`` has the get_daily_punch_details layout; everything but
+        the per-punch details comes from one compute_daily_attendance pass.
+        """
+        summary, ordered = compute_daily_attendance(punches)
+        locations = {device_id: self.get_device_location(device_id) for device_id in ordered["device_id"].unique()}
+        details = pd.DataFrame({
+            "time": ordered["log_date"],
+            "type": ordered["c1"].str.upper(),
+            "device_id": ordered["device_id"],
+            "location": ordered["device_id"].map(locations)
+        }).to_dict("records")
+        
+        for row in summary.itertuples(index=False):
+            yield row.user_id, row.day, {
+                "first_in": row.first_in,
+                "last_out": row.last_out,
+                "total_punches": int(row.total_punches),
+                "in_punches": int(row.in_punches),
+                "out_punches": int(row.out_punches),
+                "punch_details": details[row.start:row.stop],
+                "working_hours": round(float(row.working_hours), 2),
+                "status": row.status
+            }, float(row.total_hours)
     
     def get_daily_punch_details(self, logs_for_day):
         """Get detailed punch information with proper IN/OUT times"""
@@ -187,140 +631,30 @@ class GoogleSheetsService:
                 "status": "Absent"
             }
         
-        # Sort logs by time
-        logs_for_day.sort(key=lambda x: x.get('log_date', ''))
-        
-        # Filter IN and OUT punches
-        in_punches = [log for log in logs_for_day if log.get('c1', '').lower() == 'in']
-        out_punches = [log for log in logs_for_day if log.get('c1', '').lower() == 'out']
-        
-        # Get first IN punch (login time)
-        first_in = in_punches[0] if in_punches else None
-        # Get last OUT punch (logout time)
-        last_out = out_punches[-1] if out_punches else None
-        
-        # Create punch details
-        punch_details = []
-        for log in logs_for_day:
-            punch_details.append({
-                "time": log.get('log_date', ''),
-                "type": log.get('c1', '').upper(),
-                "device_id": log.get('device_id', ''),
-                "location": self.get_device_location(log.get('device_id', ''))
-            })
-        
-        # Calculate working hours using first IN and last OUT
-        working_hours = 0.0
-        if first_in and last_out:
-            working_hours = self.calculate_working_hours_in_out(first_in, last_out)
-        elif first_in and not last_out:
-            # If no OUT punch, calculate from first IN to last punch
-            working_hours = self.calculate_working_hours([first_in, logs_for_day[-1]])
-        
-        # Calculate attendance status
-        status = self.calculate_attendance_status(logs_for_day)
-        
-        return {
-            "first_in": first_in.get('log_date', '') if first_in else None,
-            "last_out": last_out.get('log_date', '') if last_out else None,
-            "total_punches": len(logs_for_day),
-            "in_punches": len(in_punches),
-            "out_punches": len(out_punches),
-            "punch_details": punch_details,
-            "working_hours": round(working_hours, 2),
-            "status": status
-        }
+        _, _, attendance, _ = next(self._daily_attendance(punch_frame(logs_for_day, grouped=False)))
+        return attendance
     
     def calculate_working_hours_in_out(self, first_in, last_out):
         """Calculate working hours between first IN and last OUT punch"""
-        try:
-            first_time_str = first_in.get('log_date', '')
-            last_time_str = last_out.get('log_date', '')
-            
-            if not first_time_str or not last_time_str:
-                return 0.0
-            
-            # Parse times
-            first_time = datetime.strptime(first_time_str.strip(), "%I:%M:%S %p")
-            last_time = datetime.strptime(last_time_str.strip(), "%I:%M:%S %p")
-            
-            # Calculate difference
-            time_diff = last_time - first_time
-            hours = time_diff.total_seconds() / 3600
-            
-            # Handle overnight shifts
-            if hours < 0:
-                hours += 24
-            
-            # Subtract standard lunch break (1 hour) if more than 5 hours
-            if hours > 5:
-                hours -= 1
-            
-            return max(0, hours)
-        except:
-            return 0.0
-
+        punches = punch_frame([{**first_in, "c1": "in"}, {**last_out, "c1": "out"}], grouped=False)
+        summary, _ = compute_daily_attendance(punches)
+        return float(summary["working_hours"].iat[0])
+    
     def calculate_attendance_status(self, logs_for_day):
         """Simplified attendance status calculation - only Present or Absent"""
         if not logs_for_day:
             return "Absent"
         
-        # Sort logs by time
-        logs_for_day.sort(key=lambda x: x.get('log_date', ''))
-        
-        # Check if there are any "in" punches - if yes, employee is Present
-        in_punches = [log for log in logs_for_day if log.get('c1', '').lower() == 'in']
-        
-        if in_punches:
-            # Employee has at least one "in" punch, so they are Present
-            return "Present"
-        else:
-            # No "in" punches, check if there are any logs at all
-            if logs_for_day:
-                # Has some logs but no "in" punches, might be all "out" punches
-                # This could mean they came in earlier (before this data) and only logged out
-                # Let's be lenient and mark as Present if they have any activity
-                return "Present"
-            else:
-                return "Absent"
+        summary, _ = compute_daily_attendance(punch_frame(logs_for_day, grouped=False))
+        return summary["status"].iat[0]
     
     def calculate_working_hours(self, logs_for_day):
         """Calculate actual working hours from punch logs"""
         if not logs_for_day or len(logs_for_day) < 2:
             return 0.0
         
-        # Sort logs by time
-        logs_for_day.sort(key=lambda x: x.get('log_date', ''))
-        
-        try:
-            first_punch = logs_for_day[0]
-            last_punch = logs_for_day[-1]
-            
-            first_time_str = first_punch.get('log_date', '')
-            last_time_str = last_punch.get('log_date', '')
-            
-            if not first_time_str or not last_time_str:
-                return 0.0
-            
-            # Parse times
-            first_time = datetime.strptime(first_time_str.strip(), "%I:%M:%S %p")
-            last_time = datetime.strptime(last_time_str.strip(), "%I:%M:%S %p")
-            
-            # Calculate difference
-            time_diff = last_time - first_time
-            hours = time_diff.total_seconds() / 3600
-            
-            # Handle overnight shifts (if last punch is before first punch)
-            if hours < 0:
-                hours += 24
-            
-            # Subtract standard lunch break (1 hour) if more than 5 hours
-            if hours > 5:
-                hours -= 1
-            
-            return max(0, hours)
-        except:
-            return 0.0
+        summary, _ = compute_daily_attendance(punch_frame(logs_for_day, grouped=False))
+        return float(summary["total_hours"].iat[0])
     
     def get_employee_name(self, user_id):
         """Generate employee name"""
@@ -333,8 +667,8 @@ class GoogleSheetsService:
             "Marketing", "Operations", "Sales", "Customer Support",
             "Engineering", "Quality Assurance", "Administration"
         ]
-        # Use a hash of user_id to consistently assign departments
-        hash_value = hash(str(user_id)) % len(departments)
+        # crc32 rather than hash(): str hashes are salted per process, so workers disagreed
+        hash_value = zlib.crc32(str(user_id).encode()) % len(departments)
         return departments[hash_value]
     
     def get_employee_mobile(self, user_id):
@@ -349,23 +683,9 @@ class GoogleSheetsService:
         """Get device location"""
         return self.device_locations.get(device_id, f"Location {device_id}")
     
-    async def get_daily_attendance_stats(self, date):
-        """Get daily attendance statistics for a specific date"""
+    async def get_daily_attendance_stats(self, day):
+        """Get daily attendance statistics for a specific ISO day"""
         try:
-            # Use the provided date directly (it should be from the database)
-            query = {"download_date": date}
-            
-            # Get all logs for the date
-            logs = await db.attendance_logs.find(query).to_list(length=None)
-            
-            # Group by user_id
-            user_logs = {}
-            for log in logs:
-                user_id = log.get("user_id")
-                if user_id not in user_logs:
-                    user_logs[user_id] = []
-                user_logs[user_id].append(log)
-            
             # Calculate attendance status for each user
             attendance_stats = {
                 "present": 0,
@@ -374,20 +694,17 @@ class GoogleSheetsService:
                 "total_employees": 0
             }
             
-            # Get unique users from all logs (to determine total employees)
-            all_users = await db.attendance_logs.distinct("user_id")
-            attendance_stats["total_employees"] = len(all_users)
+            # Users seen in any rollup (total employees), counted once per data version
+            attendance_stats["total_employees"] = await count_distinct(db.daily_attendance, "user_id")
             
-            # Calculate status for users who have logs
-            for user_id, user_logs_list in user_logs.items():
-                status = self.calculate_attendance_status(user_logs_list)
-                if status == "Present":
-                    attendance_stats["present"] += 1
-                elif status == "Absent":
-                    attendance_stats["absent"] += 1
+            # Status for users who have logs comes precomputed in the daily rollup; one $group over the day
+            pipeline = [{"$match": {"day": day}}, {"$group": {"_id": "$status", "count": {"$sum": 1}}}]
+            by_status = {row["_id"]: row["count"] async for row in db.daily_attendance.aggregate(pipeline)}
+            users_with_logs = sum(by_status.values())
+            attendance_stats["present"] = by_status.get("Present", 0)
+            attendance_stats["absent"] = by_status.get("Absent", 0)
             
             # Users without logs are considered absent
-            users_with_logs = len(user_logs)
             attendance_stats["absent"] += attendance_stats["total_employees"] - users_with_logs
             
             return attendance_stats
@@ -408,7 +725,7 @@ class GoogleSheetsService:
             # Get recent logs for this user
             recent_logs = await db.attendance_logs.find(
                 {"user_id": user_id}
-            ).sort("created_at", -1).limit(10).to_list(length=None)
+            ).sort([("day", -1), ("punch_seconds", -1)]).limit(10).to_list(length=None)
             
             if not recent_logs:
                 return None
@@ -417,17 +734,15 @@ class GoogleSheetsService:
             recent_logs = convert_object_id(recent_logs)
             
             # Calculate current attendance status
-            today = datetime.now().strftime("%m/%d/%Y")
-            today_logs = [log for log in recent_logs if log.get("download_date") == today]
+            today = datetime.now().strftime(ISO_DAY_FORMAT)
+            today_logs = [log for log in recent_logs if log.get("day") == today]
             current_status = self.calculate_attendance_status(today_logs)
             
+            await employee_directory.ensure_fresh()
             return {
                 "employee_id": user_id,
-                "name": self.get_employee_name(user_id),
-                "department": self.get_employee_department(user_id),
+                **employee_directory.lookup(user_id),
                 "site": self.get_device_location(recent_logs[0].get("device_id", "")),
-                "mobile": self.get_employee_mobile(user_id),
-                "email": self.get_employee_email(user_id),
                 "attendance_status": current_status,
                 "recent_logs": recent_logs
             }
@@ -435,195 +750,787 @@ class GoogleSheetsService:
             logger.error(f"Error getting employee details: {e}")
             return None
     
-    async def sync_data_from_google_sheets(self):
-        """Sync data from Google Sheets to MongoDB"""
-        try:
-            # Extract spreadsheet ID and gid from the URL
-            sheet_id = "10rKRL9trrc2QKU5OfGun1A9fpEi0oovZ"
-            gid = "959405682"
+    def _build_daily_rollups(self, logs):
+        """Precompute everything the read endpoints need for every (user, day) among ``logs``"""
+        updated_at = datetime.now()
+        for user_id, day, attendance, total_hours in self._daily_attendance(punch_frame(logs)):
+            punches = attendance["punch_details"]
+            device_id = punches[0]["device_id"]
+            yield {
+                "user_id": user_id,
+                "day": day,
+                "date": datetime.strptime(day, ISO_DAY_FORMAT).strftime(DOWNLOAD_DATE_FORMAT),
+                "device_id": device_id,
+                "site": punches[0]["location"],
+                "first_punch": punches[0]["time"],
+                "last_punch": punches[-1]["time"],
+                "punch_count": len(punches),
+                "total_hours": total_hours,
+                "status": attendance["status"],
+                "attendance": attendance,
+                "updated_at": updated_at
+            }
+    
+    async def _refresh_daily_rollups(self, logs_collection, rollup_collection, query, batch_size, written_keys=None):
+        """Recompute the daily_attendance rollups for the logs matching ``query``.
+        
+        Logs are streamed sorted by (user_id, day, punch_seconds) and handed to
+        the attendance engine ``batch_size`` whole (user, day) groups at a
+        time, so memory is bounded by one batch.
+        """
+        written = 0
+        key, batch, groups = None, [], 0
+        
+        async def flush():
+            nonlocal written, batch, groups
+            operations = []
+            for rollup in self._build_daily_rollups(batch):
+                operations.append(ReplaceOne({"user_id": rollup["user_id"], "day": rollup["day"]}, rollup, upsert=True))
+                if written_keys is not None:
+                    written_keys.add((rollup["user_id"], rollup["day"]))
+            if operations:
+                await rollup_collection.bulk_write(operations, ordered=False)
+                written += len(operations)
+            batch, groups = [], 0
+        
+        cursor = logs_collection.find(
+            query, {"_id": 0, "user_id": 1, "day": 1, "punch_seconds": 1, "log_date": 1, "c1": 1, "device_id": 1}
+        )
+        async for log in cursor.sort([("user_id", 1), ("day", 1), ("punch_seconds", 1)]):
+            log_key = (log.get("user_id"), log.get("day"))
+            if log_key != key:
+                if groups >= batch_size:
+                    await flush()
+                key = log_key
+                groups += 1
+            # Logs without a user or a parseable day get no rollup
+            if key[0] and key[1]:
+                batch.append(log)
+        
+        await flush()
+        return written
+    
+    async def _refresh_changed_rollups(self, logs_collection, rollup_collection, changed_pairs, batch_size):
+        """Recompute rollups for the (user_id, day) pairs touched by an incremental sync"""
+        users_by_day = {}
+        for user_id, day in changed_pairs:
+            if day:
+                users_by_day.setdefault(day, set()).add(user_id)
+        
+        written = 0
+        for day, user_ids in users_by_day.items():
+            written_keys = set()
+            written += await self._refresh_daily_rollups(
+                logs_collection, rollup_collection,
+                {"day": day, "user_id": {"$in": sorted(user_ids)}},
+                batch_size, written_keys
+            )
+            # Pairs whose logs moved elsewhere no longer have a rollup
+            gone = [user_id for user_id in user_ids if (user_id, day) not in written_keys]
+            if gone:
+                await rollup_collection.delete_many({"day": day, "user_id": {"$in": gone}})
+        return written
+    
+    def _transform_chunk(self, chunk):
+        """Convert a raw CSV chunk into a frame of attendance log fields.
+        
+        Typing, renaming, default filling and timestamping are done column-wise;
+        ``_frame_to_documents`` then yields the documents in one pass.
+        """
+        row_count = len(chunk)
+        frame = pd.DataFrame(index=chunk.index)
+        frame["id"] = _bulk_uuid4(row_count)
+        
+        for column, (field, kind, default) in SHEET_COLUMNS.items():
+            if column not in chunk:
+                frame[field] = default
+            elif kind is str:
+                frame[field] = chunk[column].astype(str)
+            else:
+                values = pd.to_numeric(chunk[column], errors="coerce").fillna(default)
+                frame[field] = values.astype("int64" if kind is int else "float64")
+        
+        # One timestamp per chunk; object columns keep plain datetimes for BSON
+        now = datetime.now()
+        frame["created_at"] = pd.Series(now, index=chunk.index, dtype=object)
+        frame["updated_at"] = pd.Series(now, index=chunk.index, dtype=object)
+        frame["last_modified_at"] = self._parse_last_modified(chunk)
+        frame["day"], frame["punch_seconds"], frame["punch_at"] = self._parse_punch_times(frame["download_date"], frame["log_date"])
+        return frame
+    
+    def _track_employee_chunk(self, user_state, frame, documents, today):
+        """Keep the per-user state needed to build employee records.
+        
+        Only the first device, today's logs and the 10 most recent logs are
+        retained, so memory grows with headcount instead of punch history.
+        ``documents`` must be ``_frame_to_documents(frame)``.
+        """
+        valid = (frame["user_id"] != "").to_numpy()
+        if not valid.any():
+            return
+        
+        users = frame.loc[valid, ["user_id", "device_id"]].assign(
+            day=frame.loc[valid, "day"].fillna(""), position=np.flatnonzero(valid)
+        )
+        
+        # First device seen for each new user
+        for user_id, device_id in users.drop_duplicates("user_id")[["user_id", "device_id"]].itertuples(index=False):
+            if user_id not in user_state:
+                user_state[user_id] = {"device_id": device_id, "today_logs": [], "recent_logs": [], "seen": 0}
+        
+        for user_id, position in users.loc[users["day"] == today, ["user_id", "position"]].itertuples(index=False):
+            user_state[user_id]["today_logs"].append(documents[position])
+        
+        # Min-heap on the ISO day keeps the most recent 10 logs per user
+        recent = users.sort_values("day", ascending=False, kind="stable").groupby("user_id", sort=False).head(10)
+        for user_id, day, position in recent[["user_id", "day", "position"]].itertuples(index=False):
+            state = user_state[user_id]
+            state["seen"] += 1
+            entry = (day, state["seen"], documents[position])
+            if len(state["recent_logs"]) < 10:
+                heapq.heappush(state["recent_logs"], entry)
+            else:
+                heapq.heappushpop(state["recent_logs"], entry)
+    
+    def _build_employee_documents(self, user_state):
+        """Calculate attendance status for each employee based on their logs"""
+        # Today's logs decide the status, else the most recent ones; one engine pass covers every user
+        deciding = []
+        for user_id, state in user_state.items():
+            logs = state["today_logs"] or [entry[2] for entry in state["recent_logs"]]
+            deciding.extend({**log, "user_id": user_id, "day": ""} for log in logs)
+        summary, _ = compute_daily_attendance(punch_frame(deciding))
+        statuses = dict(zip(summary["user_id"], summary["status"]))
+        
+        employees = []
+        for user_id, state in user_state.items():
+            attendance_status = statuses.get(user_id, "Absent")
+            
+            employees.append({
+                "id": str(uuid.uuid4()),
+                "employee_id": user_id,
+                "name": self.get_employee_name(user_id),
+                "department": self.get_employee_department(user_id),
+                "attendance_status": attendance_status,
+                "site": self.get_device_location(state["device_id"]),
+                "mobile": self.get_employee_mobile(user_id),
+                "email": self.get_employee_email(user_id),
+                "created_at": datetime.now(),
+                "updated_at": datetime.now()
+            })
+        return employees
+    
+    def _parse_last_modified(self, chunk):
+        """Parse the LastModifiedDate column of a chunk into datetimes (None if unparseable)"""
+        if "LastModifiedDate" not in chunk:
+            return pd.Series(None, index=chunk.index, dtype=object)
+        
+        raw = chunk["LastModifiedDate"]
+        parsed = pd.to_datetime(raw, format=LAST_MODIFIED_FORMAT, errors="coerce")
+        missing = parsed.isna() & (raw != "")
+        if missing.any():
+            # Fall back to per-value format inference for anything non-standard
+            parsed[missing] = pd.to_datetime(raw[missing], format="mixed", errors="coerce")
+        # datetime64[us] -> object yields plain datetimes and None for NaT
+        return pd.Series(parsed.to_numpy().astype("datetime64[us]").astype(object), index=chunk.index, dtype=object)
+    
+    def _parse_punch_times(self, download_dates, log_times):
+        """Derive the normalized ``day``, ``punch_seconds`` and ``punch_at`` fields.
+        
+        Returns three object Series holding ISO day strings, ints and plain
+        datetimes respectively, with None wherever the text doesn't parse.
+        """
+        days = pd.to_datetime(download_dates.astype(str).str.strip(), format=DOWNLOAD_DATE_FORMAT, errors="coerce")
+        times = pd.to_datetime(log_times.astype(str).str.strip(), format=PUNCH_TIME_FORMAT, errors="coerce")
+        seconds = (times - times.dt.normalize()).dt.total_seconds()
+        punch_at = days + pd.to_timedelta(seconds, unit="s")
+        
+        day = days.dt.strftime(ISO_DAY_FORMAT).astype(object).where(days.notna(), None)
+        punch_seconds = seconds.astype("Int64").astype(object).where(times.notna(), None)
+        punch_at = pd.Series(punch_at.to_numpy().astype("datetime64[us]").astype(object), index=download_dates.index, dtype=object)
+        return day, punch_seconds, punch_at
+    
+    def _advance_high_water_mark(self, high_water_mark, frame):
+        """Track the newest LastModifiedDate and largest numeric DeviceLogId seen"""
+        modified = frame["last_modified_at"].dropna()
+        if len(modified):
+            modified_at = modified.max()
+            if high_water_mark.get("last_modified_at") is None or modified_at > high_water_mark["last_modified_at"]:
+                high_water_mark["last_modified_at"] = modified_at
+        
+        log_numbers = pd.to_numeric(frame["device_log_id"], errors="coerce").dropna()
+        if len(log_numbers):
+            log_number = int(log_numbers.max())
+            if high_water_mark.get("device_log_id") is None or log_number > high_water_mark["device_log_id"]:
+                high_water_mark["device_log_id"] = log_number
+    
+    async def _upsert_changed_logs(self, collection, logs, high_water_mark, counts, changed_pairs):
+        """Upsert only the logs that are new or whose LastModifiedDate changed.
+        
+        Rows that were already known to the previous run (modified before its
+        high-water mark and with a DeviceLogId at or below the largest one seen)
+        are counted as unchanged without a database lookup; the rest are
+        compared against the stored ``last_modified_date`` keyed on
+        ``device_log_id``. The (user_id, day) pairs of written rows, old and
+        new, are added to ``changed_pairs``.
+        """
+        last_modified_mark = high_water_mark.get("last_modified_at")
+        device_log_mark = high_water_mark.get("device_log_id")
+        
+        candidates = []
+        for log in logs:
+            modified_at = log.get("last_modified_at")
+            log_number = _to_int(log["device_log_id"], None)
+            if (last_modified_mark and modified_at and modified_at < last_modified_mark
+                    and device_log_mark is not None and log_number is not None and log_number <= device_log_mark):
+                counts["unchanged"] += 1
+            else:
+                candidates.append(log)
+        
+        if not candidates:
+            return
+        
+        existing = {}
+        cursor = collection.find(
+            {"device_log_id": {"$in": [log["device_log_id"] for log in candidates]}},
+            {"_id": 0, "device_log_id": 1, "last_modified_date": 1, "user_id": 1, "day": 1}
+        )
+        async for doc in cursor:
+            existing[doc["device_log_id"]] = doc
+        
+        operations = []
+        for log in candidates:
+            device_log_id = log["device_log_id"]
+            previous = existing.get(device_log_id)
+            if previous and previous.get("last_modified_date") == log["last_modified_date"]:
+                counts["unchanged"] += 1
+                continue
             
-            # Construct proper CSV export URL
-            csv_url = f"https://docs.google.com/spreadsheets/d/{sheet_id}/export?format=csv&gid={gid}"
+            changed_pairs.add((log["user_id"], log["day"]))
+            if previous:
+                changed_pairs.add((previous.get("user_id"), previous.get("day")))
             
-            logger.info(f"Syncing data from Google Sheets: {csv_url}")
+            fields = {k: v for k, v in log.items() if k not in ("id", "created_at", "_id")}
+            operations.append(UpdateOne(
+                {"device_log_id": device_log_id},
+                {"$set": fields, "$setOnInsert": {"id": log["id"], "created_at": log["created_at"]}},
+                upsert=True
+            ))
+        
+        if operations:
+            write_result = await collection.bulk_write(operations, ordered=False)
+            counts["inserted"] += write_result.upserted_count
+            counts["updated"] += write_result.modified_count
+            # Rows rewritten with identical content count as unchanged
+            counts["unchanged"] += len(operations) - write_result.upserted_count - write_result.modified_count
+    
+    async def _upsert_employees(self, collection, employees, batch_size, counts):
+        """Insert new employees and write only the synced fields that changed.
+        
+        Name, department, site and contact details are derived placeholders
+        written with ``$setOnInsert``, so edits made through the API survive
+        later syncs; SYNCED_EMPLOYEE_FIELDS are compared against the stored
+        documents and ``$set`` (with ``updated_at``) only when they differ.
+        """
+        for start in range(0, len(employees), batch_size):
+            batch = employees[start:start + batch_size]
+            existing = {}
+            cursor = collection.find(
+                {"employee_id": {"$in": [employee["employee_id"] for employee in batch]}},
+                {"_id": 0, "employee_id": 1, **{field: 1 for field in SYNCED_EMPLOYEE_FIELDS}}
+            )
+            async for doc in cursor:
+                existing[doc["employee_id"]] = doc
             
-            response = requests.get(csv_url)
+            operations = []
+            for employee in batch:
+                previous = existing.get(employee["employee_id"])
+                if previous is None:
+                    fields = {k: v for k, v in employee.items() if k != "employee_id"}
+                    operations.append(UpdateOne({"employee_id": employee["employee_id"]}, {"$setOnInsert": fields}, upsert=True))
+                    continue
+                
+                changed = {field: employee[field] for field in SYNCED_EMPLOYEE_FIELDS if previous.get(field) != employee[field]}
+                if not changed:
+                    counts["employees_unchanged"] += 1
+                    continue
+                changed["updated_at"] = employee["updated_at"]
+                operations.append(UpdateOne({"employee_id": employee["employee_id"]}, {"$set": changed}))
             
-            if response.status_code != 200:
-                raise Exception(f"Failed to fetch data from Google Sheets: {response.status_code}")
+            if operations:
+                write_result = await collection.bulk_write(operations, ordered=False)
+                counts["employees_inserted"] += write_result.upserted_count
+                counts["employees_updated"] += write_result.modified_count
+                # Inserted or changed concurrently by someone else
+                counts["employees_unchanged"] += len(operations) - write_result.upserted_count - write_result.modified_count
+        return len(employees)
+    
+    async def _write_logs(self, collection, logs, mode, high_water_mark, batch_size, result, changed_pairs):
+        """Write a batch of logs according to the sync mode"""
+        if mode == "full":
+            inserted = await self._insert_in_batches(collection, logs, batch_size)
+            result["inserted"] += inserted
+        else:
+            await self._upsert_changed_logs(collection, logs, high_water_mark, result, changed_pairs)
+    
+    async def _insert_in_batches(self, collection, documents, batch_size):
+        """Insert documents with bounded insert_many calls"""
+        inserted = 0
+        for start in range(0, len(documents), batch_size):
+            batch = documents[start:start + batch_size]
+            await collection.insert_many(batch, ordered=False)
+            inserted += len(batch)
+        return inserted
+    
+    def _get_http_client(self):
+        """Shared async HTTP client for sheet downloads"""
+        if self._http_client is None:
+            self._http_client = httpx.AsyncClient(
+                timeout=httpx.Timeout(SYNC_HTTP_TIMEOUT, connect=10.0),
+                follow_redirects=True
+            )
+        return self._http_client
+    
+    async def close(self):
+        """Release the shared HTTP client"""
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+    
+    async def _download_sheet(self, csv_url, sync_state, conditional=True):
+        """Download the CSV export into a spooled temporary file without blocking the event loop.
+        
+        Sends If-None-Match / If-Modified-Since from the previous run when
+        ``conditional`` is set and retries transport errors and 429/5xx
+        responses with exponential backoff. Returns None on 304 Not Modified.
+        """
+        headers = {}
+        if conditional:
+            if sync_state.get("etag"):
+                headers["If-None-Match"] = sync_state["etag"]
+            if sync_state.get("last_modified"):
+                headers["If-Modified-Since"] = sync_state["last_modified"]
+        
+        client = self._get_http_client()
+        attempt = 0
+        while True:
+            buffer = tempfile.SpooledTemporaryFile(max_size=SYNC_SPOOL_MAX_BYTES)
+            try:
+                async with client.stream("GET", csv_url, headers=headers) as response:
+                    if response.status_code == 304:
+                        buffer.close()
+                        return None
+                    
+                    if response.status_code == 200:
+                        digest = hashlib.sha256()
+                        size = 0
+                        async for block in response.aiter_bytes():
+                            digest.update(block)
+                            buffer.write(block)
+                            size += len(block)
+                        buffer.seek(0)
+                        return {
+                            "file": buffer,
+                            "bytes": size,
+                            "content_hash": digest.hexdigest(),
+                            "etag": response.headers.get("etag"),
+                            "last_modified": response.headers.get("last-modified")
+                        }
+                    
+                    if response.status_code not in SYNC_RETRY_STATUSES or attempt >= SYNC_HTTP_RETRIES:
+                        raise Exception(f"Failed to fetch data from Google Sheets: {response.status_code}")
+                    error = f"HTTP {response.status_code}"
+            except httpx.TransportError as e:
+                if attempt >= SYNC_HTTP_RETRIES:
+                    buffer.close()
+                    raise Exception(f"Failed to fetch data from Google Sheets: {e}")
+                error = str(e) or type(e).__name__
+            except BaseException:
+                buffer.close()
+                raise
             
-            # Parse CSV data
-            from io import StringIO
-            df = pd.read_csv(StringIO(response.text))
+            buffer.close()
+            delay = SYNC_HTTP_BACKOFF * (2 ** attempt)
+            attempt += 1
+            logger.warning(f"Sheet download failed ({error}), retry {attempt}/{SYNC_HTTP_RETRIES} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+    
+    def default_source(self):
+        """The configured sync source: SYNC_SOURCE if set, otherwise the Google Sheet"""
+        if SYNC_SOURCE:
+            return build_ingest_source(SYNC_SOURCE, self)
+        return GoogleSheetSource(self, self.csv_url)
+    
+    def _process_next_chunk(self, reader, user_state, high_water_mark, today):
+        """Read and transform the next source chunk (runs in a worker thread).
+        
+        Returns the chunk's documents, or None once the reader is exhausted.
+        """
+        chunk = next(reader, None)
+        if chunk is None:
+            return None
+        
+        frame = self._transform_chunk(chunk)
+        documents = _frame_to_documents(frame)
+        self._track_employee_chunk(user_state, frame, documents, today)
+        self._advance_high_water_mark(high_water_mark, frame)
+        return documents
+    
+    async def sync_data_from_google_sheets(self, chunk_size: int = None, batch_size: int = None, mode: str = None):
+        """Sync data from the configured source (the Google Sheet by default) to MongoDB"""
+        return await self.run_ingest(self.default_source(), chunk_size=chunk_size, batch_size=batch_size, mode=mode)
+    
+    async def run_ingest(self, source: IngestSource, chunk_size: int = None, batch_size: int = None, mode: str = None):
+        """Ingest punch rows from ``source`` into MongoDB.
+        
+        The sheet export is downloaded asynchronously into a spooled temp file
+        (file sources are read in place), then parsed ``chunk_size`` rows at a
+        time off the event loop and written ``batch_size`` documents per round
+        trip, so peak memory stays flat regardless of the input size. An
+        unchanged source (304 or same content hash as the last run)
+        short-circuits the sync.
+        
+        In ``incremental`` mode (the default) logs are upserted on
+        ``device_log_id`` and only new or modified rows are written; ``full``
+        mode always re-downloads and builds a new generation of both
+        collections, swapped in only once it is complete and indexed.
+        """
+        chunk_size = chunk_size or self.chunk_size
+        batch_size = batch_size or self.batch_size
+        mode = mode or SYNC_MODE
+        started = time.monotonic()
+        result = {
+            "status": "success",
+            "source": source.describe(),
+            "mode": mode,
+            "skipped": None,
+            "employees_count": 0,
+            "employees_inserted": 0,
+            "employees_updated": 0,
+            "employees_unchanged": 0,
+            "logs_count": 0,
+            "inserted": 0,
+            "updated": 0,
+            "unchanged": 0,
+            "rollups_updated": 0,
+            "high_water_mark": None,
+            "generation": None,
+            "bytes_downloaded": 0,
+            "content_hash": None,
+            "chunks": 0,
+            "chunk_size": chunk_size,
+            "batch_size": batch_size,
+            "phases": {},
+            "duration_seconds": 0.0,
+            "rows_per_second": 0.0,
+            "error": None
+        }
+        phases = result["phases"]
+        
+        def add_phase(name, since):
+            phases[name] = round(phases.get(name, 0.0) + time.monotonic() - since, 3)
+        
+        payload = None
+        try:
+            if mode not in SYNC_MODES:
+                raise ValueError(f"Unknown sync mode: {mode}")
             
-            logger.info(f"Loaded {len(df)} rows from Google Sheets")
+            # Another worker may have swapped or rolled back generations since our last
+            # refresh; incremental writes must land in the generation that is live now
+            await db.refresh_generations()
             
-            # Clear existing data
-            await db.attendance_logs.delete_many({})
+            logger.info(f"Syncing data from {source.describe()} (mode={mode}, chunk_size={chunk_size}, batch_size={batch_size})")
             
-            # Process each row
-            logs_to_insert = []
-            user_logs = {}  # Group logs by user_id
+            sync_state = await db.sync_state.find_one({"_id": source.state_id}) or {}
+            conditional = mode == "incremental"
             
-            for index, row in df.iterrows():
-                # Create attendance log
-                log_data = {
-                    "id": str(uuid.uuid4()),
-                    "device_log_id": str(row.get("DeviceLogId", "")),
-                    "download_date": str(row.get("DownloadDate", "")),
-                    "device_id": str(row.get("DeviceId", "")),
-                    "user_id": str(row.get("UserId", "")),
-                    "log_date": str(row.get("LogDate", "")),
-                    "direction": str(row.get("Direction", "")),
-                    "att_direction": str(row.get("AttDirection", "")),
-                    "c1": str(row.get("C1", "")),
-                    "work_code": str(row.get("WorkCode", "")),
-                    "longitude": str(row.get("Longitude", "")),
-                    "latitude": str(row.get("Latitude", "")),
-                    "is_approved": int(row.get("IsApproved", -1)),
-                    "created_date": str(row.get("CreatedDate", "")),
-                    "last_modified_date": str(row.get("LastModifiedDate", "")),
-                    "location_address": str(row.get("LocationAddress", "")),
-                    "body_temperature": float(row.get("BodyTemperature", 0.0)),
-                    "is_mask_on": int(row.get("IsMaskOn", 0)),
-                    "created_at": datetime.now(),
-                    "updated_at": datetime.now()
-                }
-                logs_to_insert.append(log_data)
-                
-                # Group logs by user_id for proper attendance calculation
-                user_id = log_data.get("user_id", "")
-                if user_id:
-                    if user_id not in user_logs:
-                        user_logs[user_id] = []
-                    user_logs[user_id].append(log_data)
+            phase_started = time.monotonic()
+            payload = await source.open(sync_state, conditional, chunk_size)
+            add_phase("download", phase_started)
+            if payload is None:
+                logger.info(f"{source.describe()} not modified since the last sync, skipping")
+                result["skipped"] = "not_modified"
+                result["content_hash"] = sync_state.get("content_hash")
+                return result
             
-            # Calculate attendance status for each employee based on their logs
-            employees = {}
-            for user_id, logs in user_logs.items():
-                if user_id and user_id not in employees:
-                    # Get today's date for comparison
-                    today = datetime.now().strftime("%m/%d/%Y")
-                    
-                    # Filter logs for today to calculate current attendance status
-                    today_logs = [log for log in logs if log.get("download_date") == today]
-                    
-                    # Calculate attendance status using the proper logic
-                    if today_logs:
-                        attendance_status = self.calculate_attendance_status(today_logs)
-                    else:
-                        # If no logs for today, check most recent logs
-                        recent_logs = sorted(logs, key=lambda x: x.get("download_date", ""), reverse=True)[:10]
-                        attendance_status = self.calculate_attendance_status(recent_logs) if recent_logs else "Absent"
-                    
-                    employees[user_id] = {
-                        "id": str(uuid.uuid4()),
-                        "employee_id": user_id,
-                        "name": self.get_employee_name(user_id),
-                        "department": self.get_employee_department(user_id),
-                        "attendance_status": attendance_status,
-                        "site": self.get_device_location(logs[0].get("device_id", "")),
-                        "mobile": self.get_employee_mobile(user_id),
-                        "email": self.get_employee_email(user_id),
-                        "created_at": datetime.now(),
-                        "updated_at": datetime.now()
-                    }
+            result["bytes_downloaded"] = payload["bytes"]
+            result["content_hash"] = payload["content_hash"]
+            if conditional and payload["content_hash"] == sync_state.get("content_hash"):
+                logger.info(f"{source.describe()} unchanged since the last sync, skipping")
+                result["skipped"] = "content_unchanged"
+                return result
             
-            # Insert attendance logs
-            if logs_to_insert:
-                await db.attendance_logs.insert_many(logs_to_insert)
-                logger.info(f"Inserted {len(logs_to_insert)} attendance logs")
+            reader = payload["chunks"]
             
-            # Insert/update employees
-            if employees:
-                await db.employees.delete_many({})
-                await db.employees.insert_many(list(employees.values()))
-                logger.info(f"Inserted {len(employees)} employees")
+            high_water_mark = {}
+            if mode == "incremental":
+                if await db.attendance_logs.estimated_document_count() == 0:
+                    # Nothing to diff against, a plain bulk load is much cheaper
+                    mode = result["mode"] = "full"
+                else:
+                    # The diff looks rows up by device_log_id
+                    await ensure_indexes()
+                    high_water_mark = sync_state.get("high_water_mark") or {}
             
-            return list(employees.values())
+            if mode == "full":
+                # Build into staging collections; readers keep the live generation
+                generation, targets = await db.begin_generation()
+                result["generation"] = generation
+            else:
+                targets = {name: db[name] for name in GENERATIONAL_COLLECTIONS}
             
-        except Exception as e:
-            logger.error(f"Error fetching data from Google Sheets: {e}")
-            return []
-    
-    async def get_employees_date_wise_data(self, start_date: str, end_date: str, employee_id: str = None):
-        """Get comprehensive date-wise employee data"""
-        try:
-            # Build query
-            query = {}
-            if employee_id:
-                query["user_id"] = employee_id
+            today = datetime.now().strftime(ISO_DAY_FORMAT)
+            user_state = {}  # Per-user state for employee records
+            changed_pairs = set()  # (user_id, day) rollups to recompute in incremental mode
+            pending = []
+            new_high_water_mark = dict(high_water_mark)
             
-            # Date range query
-            if start_date and end_date:
-                query["download_date"] = {
-                    "$gte": start_date,
-                    "$lte": end_date
-                }
-            elif start_date:
-                query["download_date"] = start_date
+            while True:
+                phase_started = time.monotonic()
+                documents = await asyncio.to_thread(
+                    self._process_next_chunk, reader, user_state, new_high_water_mark, today
+                )
+                add_phase("parse_transform", phase_started)
+                if documents is None:
+                    break
+                
+                result["chunks"] += 1
+                pending.extend(documents)
+                phase_started = time.monotonic()
+                while len(pending) >= batch_size:
+                    batch, pending = pending[:batch_size], pending[batch_size:]
+                    await self._write_logs(targets["attendance_logs"], batch, mode, high_water_mark, batch_size, result, changed_pairs)
+                    result["logs_count"] += len(batch)
+                add_phase("write_logs", phase_started)
+                
+                logger.info(f"Processed chunk {result['chunks']} ({result['logs_count'] + len(pending)} rows so far)")
             
-            # Get all logs for the period
-            logs = await db.attendance_logs.find(query).sort("download_date", 1).to_list(length=None)
+            # Write remaining attendance logs
+            if pending:
+                phase_started = time.monotonic()
+                await self._write_logs(targets["attendance_logs"], pending, mode, high_water_mark, batch_size, result, changed_pairs)
+                result["logs_count"] += len(pending)
+                add_phase("write_logs", phase_started)
+            logger.info(
+                f"Processed {result['logs_count']} attendance logs: {result['inserted']} inserted, "
+                f"{result['updated']} updated, {result['unchanged']} unchanged"
+            )
             
-            # Group by employee and date
-            employee_date_data = {}
+            # Insert/update employees
+            phase_started = time.monotonic()
+            employees = self._build_employee_documents(user_state)
+            if employees:
+                if mode == "full":
+                    result["employees_count"] = await self._insert_in_batches(targets["employees"], employees, batch_size)
+                    result["employees_inserted"] = result["employees_count"]
+                else:
+                    result["employees_count"] = await self._upsert_employees(targets["employees"], employees, batch_size, result)
+                logger.info(
+                    f"Synced {len(employees)} employees: {result['employees_inserted']} inserted, "
+                    f"{result['employees_updated']} updated, {result['employees_unchanged']} unchanged"
+                )
+            add_phase("employees", phase_started)
             
-            for log in logs:
-                user_id = log.get("user_id")
-                date = log.get("download_date")
-                
-                if user_id and date:
-                    key = f"{user_id}_{date}"
-                    if key not in employee_date_data:
-                        employee_date_data[key] = {
-                            "employee_id": user_id,
-                            "name": self.get_employee_name(user_id),
-                            "department": self.get_employee_department(user_id),
-                            "site": self.get_device_location(log.get("device_id", "")),
-                            "date": date,
-                            "all_punches": [],
-                            "punch_count": 0,
-                            "first_punch": None,
-                            "last_punch": None,
-                            "total_hours": 0.0,
-                            "attendance_status": "Absent"
-                        }
-                    
-                    employee_date_data[key]["all_punches"].append({
-                        "time": log.get("log_date", ""),
-                        "device_id": log.get("device_id", ""),
-                        "direction": log.get("c1", ""),
-                        "location": self.get_device_location(log.get("device_id", ""))
-                    })
+            phase_started = time.monotonic()
+            await refresh_dimension_stats(targets["employees"], targets["stats_by_dimension"])
+            add_phase("stats", phase_started)
             
-            # Calculate attendance metrics for each employee-date combination
-            result = []
-            for key, data in employee_date_data.items():
-                punches = data["all_punches"]
-                if punches:
-                    # Sort punches by time
-                    punches.sort(key=lambda x: x.get("time", ""))
-                    
-                    data["punch_count"] = len(punches)
-                    data["first_punch"] = punches[0]["time"]
-                    data["last_punch"] = punches[-1]["time"]
-                    
-                    # Calculate total hours and attendance status
-                    data["total_hours"] = self.calculate_working_hours(
-                        [{"log_date": p["time"]} for p in punches]
-                    )
-                    data["attendance_status"] = self.calculate_attendance_status(
-                        [{"log_date": p["time"]} for p in punches]
-                    )
+            if mode == "full":
+                phase_started = time.monotonic()
+                # Build the indexes of the staging generation before it goes live
+                await ensure_indexes(targets)
+                add_phase("indexes", phase_started)
                 
-                result.append(data)
+                phase_started = time.monotonic()
+                result["rollups_updated"] = await self._refresh_daily_rollups(
+                    targets["attendance_logs"], targets["daily_attendance"], {}, batch_size
+                )
+                add_phase("rollups", phase_started)
+                
+                phase_started = time.monotonic()
+                active = await db.activate_generation(generation)
+                # The new generation holds only this source's rows
+                await clear_sync_bookmarks(keep=source.state_id)
+                add_phase("swap", phase_started)
+                logger.info(f"Activated generation {generation}: {active}")
+            elif changed_pairs:
+                phase_started = time.monotonic()
+                result["rollups_updated"] = await self._refresh_changed_rollups(
+                    targets["attendance_logs"], targets["daily_attendance"], changed_pairs, batch_size
+                )
+                add_phase("rollups", phase_started)
+            logger.info(f"Refreshed {result['rollups_updated']} daily attendance rollups")
             
-            # Sort by date and then by employee_id
-            result.sort(key=lambda x: (x["date"], x["employee_id"]))
+            # Remember where this run stopped for the next incremental sync
+            await db.sync_state.update_one(
+                {"_id": source.state_id},
+                {"$set": {
+                    "high_water_mark": new_high_water_mark,
+                    "etag": payload["etag"],
+                    "last_modified": payload["last_modified"],
+                    "content_hash": payload["content_hash"],
+                    "last_mode": mode,
+                    "updated_at": datetime.now()
+                }},
+                upsert=True
+            )
+            result["high_water_mark"] = new_high_water_mark
             
-            return result
+        except Exception as e:
+            logger.error(f"Error syncing data from {source.describe()}: {e}")
+            result["status"] = "failed"
+            result["error"] = str(e)
+        finally:
+            if payload is not None:
+                payload["close"]()
+            duration = time.monotonic() - started
+            result["duration_seconds"] = round(duration, 3)
+            result["rows_per_second"] = round(result["logs_count"] / duration, 1) if duration > 0 else 0.0
+        
+        return result
+    
+    async def _needs_rollup_migration(self):
+        if await db.attendance_logs.find_one({"day": {"$exists": False}}, {"_id": 1}):
+            return True
+        if await db.daily_attendance.find_one({"day": {"$exists": False}}, {"_id": 1}):
+            return True
+        return (await db.daily_attendance.estimated_document_count() == 0
+                and await db.attendance_logs.estimated_document_count() > 0)
+    
+    async def _needs_dimension_stats(self):
+        return (await db.stats_by_dimension.estimated_document_count() == 0
+                and await db.employees.estimated_document_count() > 0)
+    
+    async def needs_migration(self):
+        """True when live data predates the normalized time fields, the daily rollups or the dimension stats"""
+        return await self._needs_rollup_migration() or await self._needs_dimension_stats()
+    
+    async def backfill_punch_times(self):
+        """Add ``day``, ``punch_seconds`` and ``punch_at`` to logs ingested before they existed"""
+        updated = 0
+        cursor = db.attendance_logs.find({"day": {"$exists": False}}, {"_id": 1, "download_date": 1, "log_date": 1})
+        while True:
+            batch = await cursor.to_list(length=self.batch_size)
+            if not batch:
+                break
+            frame = pd.DataFrame(batch, columns=["_id", "download_date", "log_date"]).fillna("")
+            days, seconds, punch_times = self._parse_punch_times(frame["download_date"], frame["log_date"])
+            operations = [
+                UpdateOne({"_id": _id}, {"$set": {"day": day, "punch_seconds": punch_seconds, "punch_at": punch_at}})
+                for _id, day, punch_seconds, punch_at in zip(frame["_id"].tolist(), days.tolist(), seconds.tolist(), punch_times.tolist())
+            ]
+            await db.attendance_logs.bulk_write(operations, ordered=False)
+            updated += len(operations)
+        return updated
+    
+    async def migrate_attendance_data(self):
+        """Backfill normalized time fields and recompute every daily_attendance rollup, then
+        materialize stats_by_dimension; each step runs only if it is missing"""
+        written = 0
+        if await self._needs_rollup_migration():
+            backfilled = await self.backfill_punch_times()
+            logger.info(f"Backfilled normalized timestamps on {backfilled} attendance logs")
             
+            await db.daily_attendance.delete_many({})
+            await ensure_indexes()
+            written = await self._refresh_daily_rollups(db.attendance_logs, db.daily_attendance, {}, self.batch_size)
+            logger.info(f"Rebuilt {written} daily attendance rollups")
+        
+        if await self._needs_dimension_stats():
+            await ensure_indexes()
+            await refresh_dimension_stats(db.employees, db.stats_by_dimension)
+            logger.info("Materialized department and site statistics")
+        return written
+    
+    def _date_wise_record(self, rollup):
+        employee = employee_directory.lookup(rollup["user_id"])
+        return {
+            "employee_id": rollup["user_id"],
+            "name": employee["name"],
+            "department": employee["department"],
+            "site": rollup["site"],
+            "date": rollup["date"],
+            "all_punches": [
+                {
+                    "time": punch["time"],
+                    "device_id": punch["device_id"],
+                    "direction": punch["type"].lower(),
+                    "location": punch["location"]
+                }
+                for punch in rollup["attendance"]["punch_details"]
+            ],
+            "punch_count": rollup["punch_count"],
+            "first_punch": rollup["first_punch"],
+            "last_punch": rollup["last_punch"],
+            "total_hours": rollup["total_hours"],
+            "attendance_status": rollup["status"]
+        }
+    
+    async def _date_wise_partition(self, query, start_day, end_day):
+        """Records of the rollups from ``start_day`` to ``end_day`` (inclusive) and the partition's timing"""
+        started = time.monotonic()
+        projection = {"_id": 0, "user_id": 1, "site": 1, "date": 1, "punch_count": 1, "first_punch": 1,
+                      "last_punch": 1, "total_hours": 1, "status": 1, "attendance.punch_details": 1}
+        cursor = db.daily_attendance.find({**query, "day": {"$gte": start_day, "$lte": end_day}}, projection)
+        records = [self._date_wise_record(rollup) async for rollup in cursor.sort([("day", 1), ("user_id", 1)])]
+        return records, {
+            "start_day": start_day,
+            "end_day": end_day,
+            "records": len(records),
+            "seconds": round(time.monotonic() - started, 4)
+        }
+    
+    async def iter_employees_date_wise(self, start_day: str, end_day: str, employee_id: str = None, timings=None):
+        """Yield date-wise employee records (``start_day``/``end_day`` are ISO days) by date, then employee_id.
+        
+        The range is split into REPORT_PARTITION_DAYS partitions; up to
+        REPORT_PARALLELISM of them are queried concurrently ahead of the
+        consumer and yielded in order, so memory is bounded by that many
+        partitions however long the range is. A single employee's range is
+        small and served by one indexed query, so it is not partitioned.
+        Each finished partition's timing is appended to ``timings``.
+        """
+        query = {}
+        if employee_id:
+            query["user_id"] = employee_id
+        timings = [] if timings is None else timings
+        end_day = end_day or start_day
+        
+        # Partition only the days that have data, not every day of a wide range
+        in_range = {**query, "day": {"$gte": start_day, "$lte": end_day}}
+        first = await db.daily_attendance.find_one(in_range, {"_id": 0, "day": 1}, sort=[("day", 1)])
+        if first is None:
+            return
+        last = await db.daily_attendance.find_one(in_range, {"_id": 0, "day": 1}, sort=[("day", -1)])
+        
+        await employee_directory.ensure_fresh()
+        pending = collections.deque()
+        if employee_id:
+            partitions = iter([(first["day"], last["day"])])
+        else:
+            partitions = iter(date_partitions(first["day"], last["day"], REPORT_PARTITION_DAYS))
+        
+        def schedule():
+            for first_day, last_day in itertools.islice(partitions, max(REPORT_PARALLELISM, 1) - len(pending)):
+                pending.append(asyncio.create_task(self._date_wise_partition(query, first_day, last_day)))
+        
+        try:
+            schedule()
+            while pending:
+                records, timing = await pending.popleft()
+                timings.append(timing)
+                schedule()
+                for record in records:
+                    yield record
+        finally:
+            # Stop the partitions still running when the consumer goes away early
+            for task in pending:
+                task.cancel()
+    
+    async def get_employees_date_wise_data(self, start_day: str, end_day: str, employee_id: str = None):
+        """Get comprehensive date-wise employee data as a list"""
+        try:
+            return [record async for record in self.iter_employees_date_wise(start_day, end_day, employee_id)]
         except Exception as e:
             logger.error(f"Error getting date-wise employee data: {e}")
             return []
@@ -631,7 +1538,949 @@ class GoogleSheetsService:
 # Initialize Google Sheets service
 sheets_service = GoogleSheetsService()
 
+class SyncScheduler:
+    """Runs Google Sheets syncs as background jobs, one at a time across all workers.
+    
+    Exclusivity comes from a lease document in ``sync_locks`` that the running
+    worker renews until the job finishes; jobs are recorded in ``sync_jobs``.
+    """
+    
+    def __init__(self, service, interval_minutes: float = 0):
+        self.service = service
+        self.interval_seconds = interval_minutes * 60
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._job_task = None
+        self._job = None
+        self._exclusive = None  # purpose of a non-sync operation holding the lease in this worker
+        self._schedule_task = None
+        self._initial_load_task = None
+        self.initial_load = {"status": "pending", "error": None, "finished_at": None}
+    
+    async def _acquire_lock(self, job_id=None, operation="sync"):
+        """Take the sync lease for a sync job or another ``operation``.
+        
+        Fails while the lease is live, including when this worker holds it
+        (not re-entrant).
+        """
+        now = datetime.utcnow()
+        try:
+            await db.sync_locks.find_one_and_update(
+                {"_id": SYNC_LOCK_ID, "expires_at": {"$lt": now}},
+                {"$set": {
+                    "owner": self.owner,
+                    "job_id": job_id,
+                    "operation": operation,
+                    "acquired_at": now,
+                    "expires_at": now + timedelta(seconds=SYNC_LOCK_TTL_SECONDS)
+                }},
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            return False
+    
+    async def _renew_lock(self):
+        """Keep extending the lease while the job runs"""
+        while True:
+            await asyncio.sleep(SYNC_LOCK_TTL_SECONDS / 3)
+            try:
+                await db.sync_locks.update_one(
+                    {"_id": SYNC_LOCK_ID, "owner": self.owner},
+                    {"$set": {"expires_at": datetime.utcnow() + timedelta(seconds=SYNC_LOCK_TTL_SECONDS)}}
+                )
+            except Exception as e:
+                # A transient failure must not end the heartbeat; the next beat retries
+                logger.warning(f"Could not renew the sync lease: {e}")
+    
+    async def _release_lock(self):
+        await db.sync_locks.delete_one({"_id": SYNC_LOCK_ID, "owner": self.owner})
+    
+    async def acquire_exclusive(self, purpose):
+        """Hold the sync lease for a non-sync operation (e.g. a rollback)"""
+        if self._exclusive is not None or (self._job_task is not None and not self._job_task.done()):
+            return False
+        # Claimed before awaiting so a concurrent enqueue in this worker backs off
+        self._exclusive = purpose
+        if not await self._acquire_lock(operation=purpose):
+            self._exclusive = None
+            return False
+        return True
+    
+    async def release_exclusive(self):
+        try:
+            await self._release_lock()
+        finally:
+            self._exclusive = None
+    
+    async def _held_lock(self):
+        """Return the live lease document, if any worker currently holds it"""
+        lock = await db.sync_locks.find_one({"_id": SYNC_LOCK_ID})
+        if lock and lock.get("expires_at") and lock["expires_at"] > datetime.utcnow():
+            return lock
+        return None
+    
+    async def _running(self, lock):
+        """The operation holding ``lock`` and its sync job document (None unless it is a sync)"""
+        # Leases taken before "operation" was recorded were always syncs
+        operation = lock.get("operation") or "sync"
+        job = None
+        if operation == "sync" and lock.get("job_id"):
+            job = await db.sync_jobs.find_one({"id": lock["job_id"]}, {"_id": 0})
+        return operation, job
+    
+    async def enqueue(self, trigger: str, mode: str = None, requested_by: str = None, source: IngestSource = None):
+        """Start a sync job in the background.
+        
+        Returns ``(job, created)``; when a sync is already running anywhere the
+        running job is returned with ``created`` False.
+        """
+        if self._job_task is not None and not self._job_task.done():
+            return self._job, False
+        if self._exclusive is not None:
+            return {"id": None, "status": "running", "operation": self._exclusive}, False
+        
+        job_id = str(uuid.uuid4())
+        if not await self._acquire_lock(job_id):
+            lock = await self._held_lock()
+            if lock is None:
+                return {"id": None, "status": "running", "operation": "sync"}, False
+            operation, running = await self._running(lock)
+            return running or {"id": lock.get("job_id"), "status": "running", "operation": operation}, False
+        
+        source = source or self.service.default_source()
+        job = {
+            "id": job_id,
+            "status": "running",
+            "trigger": trigger,
+            "source": source.describe(),
+            "mode": mode or SYNC_MODE,
+            "requested_by": requested_by,
+            "worker": self.owner,
+            "created_at": datetime.now(),
+            "started_at": datetime.now(),
+            "finished_at": None,
+            "duration_seconds": None,
+            "phases": {},
+            "rows_per_second": None,
+            "result": None,
+            "error": None
+        }
+        try:
+            await db.sync_jobs.insert_one(job)
+        except Exception:
+            await self._release_lock()
+            raise
+        
+        self._job = job
+        self._job_task = asyncio.create_task(self._run_job(job, source))
+        return job, True
+    
+    async def _run_job(self, job, source):
+        heartbeat = asyncio.create_task(self._renew_lock())
+        update = {}
+        try:
+            result = await self.service.run_ingest(source, mode=job["mode"])
+            if result["status"] == "success" and not result["skipped"]:
+                try:
+                    await db.bump_data_version()
+                except Exception as e:
+                    logger.error(f"Error bumping the data version: {e}")
+                try:
+                    await employee_search_index.rebuild()
+                    await employee_directory.rebuild()
+                except Exception as e:
+                    logger.error(f"Error rebuilding the employee search index and directory: {e}")
+            update = {
+                "status": "succeeded" if result["status"] == "success" else "failed",
+                "phases": result["phases"],
+                "rows_per_second": result["rows_per_second"],
+                "result": {k: v for k, v in result.items() if k not in ("phases", "error")},
+                "error": result["error"]
+            }
+        except asyncio.CancelledError:
+            update = {"status": "cancelled", "error": "Sync cancelled during shutdown"}
+            raise
+        except Exception as e:
+            logger.error(f"Sync job {job['id']} failed: {e}")
+            update = {"status": "failed", "error": str(e)}
+        finally:
+            heartbeat.cancel()
+            finished_at = datetime.now()
+            update["finished_at"] = finished_at
+            update["duration_seconds"] = round((finished_at - job["started_at"]).total_seconds(), 3)
+            job.update(update)
+            try:
+                await db.sync_jobs.update_one({"id": job["id"]}, {"$set": update})
+            finally:
+                await self._release_lock()
+            logger.info(f"Sync job {job['id']} {job['status']} in {job['duration_seconds']}s")
+    
+    async def _run_schedule(self):
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            try:
+                job, created = await self.enqueue("schedule")
+                if created:
+                    logger.info(f"Scheduled sync job {job['id']} started")
+            except Exception as e:
+                logger.error(f"Error starting scheduled sync: {e}")
+    
+    async def _wait_for_lease(self):
+        """Wait until no worker holds the sync lease"""
+        while await self._held_lock():
+            await asyncio.sleep(min(5, SYNC_LOCK_TTL_SECONDS / 3))
+    
+    async def _load_initial_data(self):
+        """Bootstrap, then a first-boot sync when the database is empty, or one-off data migrations"""
+        # Part of the retried load so a database that is late at boot doesn't wedge the worker
+        await db.refresh_generations()
+        await ensure_default_admin()
+        # Failures (e.g. legacy documents violating a unique index) are logged and retried after the load
+        await ensure_indexes()
+        
+        if await db.employees.estimated_document_count() == 0:
+            logger.info("No employees found, starting the initial sync in the background...")
+            job, created = await self.enqueue("startup")
+            if created:
+                await self._job_task
+                if job["status"] != "succeeded":
+                    raise RuntimeError(job["error"] or f"initial sync {job['status']}")
+            else:
+                # Another worker is already loading the data
+                await self._wait_for_lease()
+        elif await self.service.needs_migration():
+            # Data loaded before normalized timestamps / daily rollups existed: backfill once
+            while not await self.acquire_exclusive("attendance_migration"):
+                await self._wait_for_lease()
+            try:
+                if await self.service.needs_migration():
+                    await self.service.migrate_attendance_data()
+            finally:
+                await self.release_exclusive()
+        await ensure_indexes()
+    
+    async def _run_initial_load(self):
+        self.initial_load["status"] = "running"
+        while True:
+            try:
+                await self._load_initial_data()
+                self.initial_load.update(status="completed", error=None, finished_at=datetime.now())
+                logger.info("Initial data load completed")
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Initial data load failed, retrying in {INITIAL_LOAD_RETRY_SECONDS:g}s: {e}")
+                self.initial_load.update(status="retrying", error=str(e))
+                await asyncio.sleep(INITIAL_LOAD_RETRY_SECONDS)
+    
+    def start_initial_load(self):
+        """Run the first-boot load in the background so startup returns immediately"""
+        if self._initial_load_task is None:
+            self._initial_load_task = asyncio.create_task(self._run_initial_load())
+    
+    def start(self):
+        """Start the periodic sync loop (no-op when the interval is 0)"""
+        if self.interval_seconds > 0 and self._schedule_task is None:
+            self._schedule_task = asyncio.create_task(self._run_schedule())
+            logger.info(f"Background sync scheduled every {self.interval_seconds / 60:g} minutes")
+    
+    async def stop(self):
+        """Stop the schedule and cancel a sync still running in this worker"""
+        for task in (self._initial_load_task, self._schedule_task, self._job_task):
+            if task is not None and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
+        self._schedule_task = None
+        self._initial_load_task = None
+    
+    async def get_job(self, job_id):
+        return await db.sync_jobs.find_one({"id": job_id}, {"_id": 0})
+    
+    async def get_status(self):
+        """Running operation (a sync job, rollback or migration) if any, and the most recent finished job"""
+        running_operation, running_job = None, None
+        lock = await self._held_lock()
+        if lock:
+            running_operation, running_job = await self._running(lock)
+        
+        last_job = await db.sync_jobs.find_one(
+            {"status": {"$in": ["succeeded", "failed", "cancelled"]}}, {"_id": 0}, sort=[("finished_at", -1)]
+        )
+        last_success = await db.sync_jobs.find_one(
+            {"status": "succeeded"}, {"_id": 0, "finished_at": 1}, sort=[("finished_at", -1)]
+        )
+        return {
+            "running": running_operation is not None,
+            "running_operation": running_operation,
+            "running_job": running_job,
+            "last_job": last_job,
+            "last_sync": last_success.get("finished_at") if last_success else None,
+            "interval_minutes": self.interval_seconds / 60,
+            "initial_load": self.initial_load
+        }
+
+sync_scheduler = SyncScheduler(sheets_service, SYNC_INTERVAL_MINUTES)
+
+class EmployeeSearchIndex:
+    """In-process search over employee code and name.
+    
+    A sorted term list answers prefix lookups by bisection (a flat trie) and
+    a 2/3-gram posting map narrows infix matches to a handful of candidates.
+    Results rank exact code matches first, then prefixes, then infixes. The
+    index is rebuilt after syncs, when the employees generation changes and
+    every SEARCH_INDEX_MAX_AGE_SECONDS; this worker's CRUD updates it in place.
+    """
+    
+    FIELDS = {"_id": 0, "employee_id": 1, "name": 1, "site": 1, "department": 1}
+    
+    def __init__(self):
+        self._entries = {}  # employee_id -> projected employee document
+        self._terms = []  # sorted (term, employee_id): code, full name and each name word
+        self._grams = {}  # 2/3-gram -> {employee_id}
+        self._built_for = None  # physical employees collection the index reflects
+        self._built_at = None
+        self._rebuild_task = None
+    
+    @staticmethod
+    def _terms_for(entry):
+        code = entry["employee_id"].lower()
+        name = (entry.get("name") or "").lower()
+        return {code, name, *name.split()} - {""}
+    
+    @staticmethod
+    def _grams_for(text):
+        return {text[i:i + n] for n in (2, 3) for i in range(len(text) - n + 1)}
+    
+    def _index(self, entry, keep_sorted=True):
+        key = entry["employee_id"]
+        self._entries[key] = entry
+        for term in self._terms_for(entry):
+            if keep_sorted:
+                bisect.insort(self._terms, (term, key))
+            else:
+                self._terms.append((term, key))
+        for field in (key.lower(), (entry.get("name") or "").lower()):
+            for gram in self._grams_for(field):
+                self._grams.setdefault(gram, set()).add(key)
+    
+    def add(self, employee):
+        """Index (or re-index) one employee document"""
+        if not employee.get("employee_id"):
+            return
+        self.remove(employee["employee_id"])
+        self._index({field: employee.get(field) for field in self.FIELDS if field != "_id"})
+    
+    def remove(self, employee_id):
+        entry = self._entries.pop(employee_id, None)
+        if entry is None:
+            return
+        for term in self._terms_for(entry):
+            position = bisect.bisect_left(self._terms, (term, employee_id))
+            if position < len(self._terms) and self._terms[position] == (term, employee_id):
+                del self._terms[position]
+        for field in (employee_id.lower(), (entry.get("name") or "").lower()):
+            for gram in self._grams_for(field):
+                keys = self._grams.get(gram)
+                if keys is not None:
+                    keys.discard(employee_id)
+                    if not keys:
+                        del self._grams[gram]
+    
+    def _load(self, employees):
+        for employee in employees:
+            self._index(employee, keep_sorted=False)
+        self._terms.sort()
+    
+    async def rebuild(self):
+        """Reload every employee of the active generation"""
+        collection = db.employees
+        built_for = collection.name
+        employees = await collection.find({"employee_id": {"$nin": [None, ""]}}, self.FIELDS).to_list(length=None)
+        
+        # Build a fresh index off the event loop, then swap it in
+        fresh = EmployeeSearchIndex()
+        await asyncio.to_thread(fresh._load, employees)
+        self._entries, self._terms, self._grams = fresh._entries, fresh._terms, fresh._grams
+        self._built_for, self._built_at = built_for, time.monotonic()
+        logger.info(f"Employee search index rebuilt with {len(self._entries)} employees")
+    
+    async def ensure_fresh(self):
+        """Build on first use; afterwards refresh stale indexes in the background"""
+        if self._built_at is None:
+            await self.rebuild()
+            return
+        stale = (db.employees.name != self._built_for
+                 or time.monotonic() - self._built_at > SEARCH_INDEX_MAX_AGE_SECONDS)
+        if stale and (self._rebuild_task is None or self._rebuild_task.done()):
+            self._rebuild_task = asyncio.create_task(self.rebuild())
+    
+    def _prefix_matches(self, text):
+        keys = []
+        position = bisect.bisect_left(self._terms, (text, ""))
+        while position < len(self._terms) and self._terms[position][0].startswith(text):
+            keys.append(self._terms[position][1])
+            position += 1
+        return keys
+    
+    def _infix_matches(self, text):
+        if len(text) < 2:
+            # No gram is shorter than two characters: scan every entry
+            return {
+                key for key, entry in self._entries.items()
+                if text in key.lower() or text in (entry.get("name") or "").lower()
+            }
+        grams = self._grams_for(text[:3]) if len(text) < 3 else {text[i:i + 3] for i in range(len(text) - 2)}
+        candidates = None
+        for gram in sorted(grams, key=lambda gram: len(self._grams.get(gram, ()))):
+            keys = self._grams.get(gram, set())
+            candidates = set(keys) if candidates is None else candidates & keys
+            if not candidates:
+                return set()
+        return {
+            key for key in candidates or ()
+            if text in key.lower() or text in (self._entries[key].get("name") or "").lower()
+        }
+    
+    def search(self, query, limit=None):
+        """Employees matching ``query`` (case-insensitive), best matches first"""
+        text = query.strip().lower()
+        if not text:
+            return []
+        
+        ranked = {}
+        for key in self._prefix_matches(text):
+            rank = 0 if key.lower() == text else (1 if key.lower().startswith(text) else 2)
+            ranked[key] = min(rank, ranked.get(key, rank))
+        if limit is None or len(ranked) < limit:
+            for key in self._infix_matches(text):
+                ranked.setdefault(key, 3)
+        
+        ordered = sorted(ranked, key=lambda key: (ranked[key], key))
+        return [self._entries[key] for key in ordered[:limit]]
+
+employee_search_index = EmployeeSearchIndex()
+
+class EmployeeDirectory:
+    """In-process map of employee_id -> name, department, site, mobile and email.
+    
+    Report paths look attributes up here instead of deriving them per row,
+    so every worker shows what the employees collection holds. Like the
+    search index it is rebuilt after syncs, when the employees generation
+    changes and every EMPLOYEE_DIRECTORY_MAX_AGE_SECONDS; this worker's CRUD
+    updates it in place.
+    """
+    
+    FIELDS = ("name", "department", "site", "mobile", "email")
+    
+    def __init__(self):
+        self._entries = {}
+        self._built_for = None
+        self._built_at = None
+        self._rebuild_task = None
+    
+    def add(self, employee):
+        if employee.get("employee_id"):
+            self._entries[employee["employee_id"]] = {field: employee.get(field) for field in self.FIELDS}
+    
+    def remove(self, employee_id):
+        self._entries.pop(employee_id, None)
+    
+    def lookup(self, user_id):
+        """Directory entry of ``user_id``; users with logs but no employee record get the sync's defaults"""
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return {
+                "name": sheets_service.get_employee_name(user_id),
+                "department": sheets_service.get_employee_department(user_id),
+                "site": None,
+                "mobile": sheets_service.get_employee_mobile(user_id),
+                "email": sheets_service.get_employee_email(user_id)
+            }
+        return entry
+    
+    async def rebuild(self):
+        """Reload every employee of the active generation"""
+        collection = db.employees
+        built_for = collection.name
+        projection = {"_id": 0, "employee_id": 1, **{field: 1 for field in self.FIELDS}}
+        entries = {}
+        async for employee in collection.find({"employee_id": {"$nin": [None, ""]}}, projection):
+            entries[employee["employee_id"]] = {field: employee.get(field) for field in self.FIELDS}
+        self._entries = entries
+        self._built_for, self._built_at = built_for, time.monotonic()
+        logger.info(f"Employee directory loaded with {len(entries)} employees")
+    
+    async def ensure_fresh(self):
+        """Load on first use; afterwards refresh stale directories in the background"""
+        if self._built_at is None:
+            await self.rebuild()
+            return
+        stale = (db.employees.name != self._built_for
+                 or time.monotonic() - self._built_at > EMPLOYEE_DIRECTORY_MAX_AGE_SECONDS)
+        if stale and (self._rebuild_task is None or self._rebuild_task.done()):
+            self._rebuild_task = asyncio.create_task(self.rebuild())
+
+employee_directory = EmployeeDirectory()
+
 # Helper functions
+def _to_int(value, default):
+    """Convert a CSV cell to int, falling back to default for blanks/garbage"""
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return default
+
+@lru_cache(maxsize=PUNCH_TIME_CACHE_SIZE)
+def parse_punch_time(text: str) -> Optional[int]:
+    """Seconds since midnight of a PUNCH_TIME_FORMAT time such as "09:05:30 PM", or None.
+    
+    Accepts what ``datetime.strptime(text.strip(), PUNCH_TIME_FORMAT)`` accepts
+    for the sheet's layout without its regex machinery, and memoizes per
+    string: a day has only 86,400 distinct punch times.
+    """
+    clock, _, meridiem = text.strip().rpartition(" ")
+    meridiem = meridiem.upper()
+    parts = clock.rstrip().split(":")
+    if meridiem not in ("AM", "PM") or len(parts) != 3:
+        return None
+    if not all(part.isascii() and part.isdigit() and 0 < len(part) <= 2 for part in parts):
+        return None
+    hour, minute, second = (int(part) for part in parts)
+    if not (1 <= hour <= 12 and minute < 60 and second < 60):
+        return None
+    return (hour % 12 + (12 if meridiem == "PM" else 0)) * 3600 + minute * 60 + second
+
+def punch_frame(logs, grouped=True):
+    """Columnar PUNCH_FRAME_COLUMNS view of log documents for compute_daily_attendance.
+    
+    With ``grouped=False`` all logs form a single (user, day), whatever
+    their fields say; the per-day wrappers use that.
+    """
+    frame = pd.DataFrame.from_records(list(logs), columns=list(PUNCH_FRAME_COLUMNS))
+    if not grouped:
+        frame["user_id"] = ""
+        frame["day"] = ""
+    for column in ("user_id", "day", "log_date", "c1", "device_id"):
+        frame[column] = frame[column].fillna("").astype(str)
+    return frame
+
+def compute_daily_attendance(punches):
+    """First IN, last OUT, punch counts, working hours and status of every (user_id, day) in one pass.
+    
+    ``punches`` holds PUNCH_FRAME_COLUMNS; a missing ``punch_seconds`` is
+    parsed from ``log_date``. Returns ``(summary, ordered)``: ``ordered`` is
+    the punches sorted by user, day and time of day (unparseable times
+    first) and ``summary`` has one row per (user_id, day) with its
+    ``start``/``stop`` row range in ``ordered``.
+    
+    Working hours run from the first IN to the last OUT (wrapping past
+    midnight), or to the last punch when there is no OUT; total hours run
+    from the first to the last punch. Both lose an hour of lunch above five
+    hours and are 0 when a time does not parse. Any punch makes the day
+    Present.
+    """
+    seconds = pd.to_numeric(punches["punch_seconds"], errors="coerce").astype("float64")
+    missing = seconds.isna().to_numpy()
+    if missing.any():
+        seconds[missing] = punches.loc[missing, "log_date"].map(parse_punch_time).astype("float64")
+    ordered = (punches.assign(seconds=seconds, order=seconds.fillna(-1))
+               .sort_values(["user_id", "day", "order"], kind="stable")
+               .reset_index(drop=True))
+    
+    columns = ["user_id", "day", "start", "stop", "total_punches", "in_punches", "out_punches",
+               "first_in", "last_out", "working_hours", "total_hours", "status"]
+    if ordered.empty:
+        return pd.DataFrame(columns=columns), ordered
+    
+    # Rows are grouped contiguously; a group starts wherever the (user, day) key changes
+    users, days = ordered["user_id"].to_numpy(), ordered["day"].to_numpy()
+    new_group = np.ones(len(ordered), dtype=bool)
+    new_group[1:] = (users[1:] != users[:-1]) | (days[1:] != days[:-1])
+    starts = np.flatnonzero(new_group)
+    stops = np.append(starts[1:], len(ordered))
+    group = np.cumsum(new_group) - 1
+    
+    direction = ordered["c1"].str.lower().to_numpy()
+    is_in, is_out = direction == "in", direction == "out"
+    rows = np.arange(len(ordered))
+    first_in = np.full(len(starts), -1)
+    in_groups, first_rows = np.unique(group[is_in], return_index=True)
+    first_in[in_groups] = rows[is_in][first_rows]
+    last_out = np.full(len(starts), -1)
+    out_groups, last_rows = np.unique(group[is_out][::-1], return_index=True)
+    last_out[out_groups] = rows[is_out][::-1][last_rows]
+    has_in, has_out = first_in >= 0, last_out >= 0
+    
+    times = ordered["seconds"].to_numpy()
+    in_seconds = np.where(has_in, times[first_in], np.nan)
+    out_seconds = np.where(has_out, times[last_out], np.nan)
+    first_seconds, last_seconds = times[starts], times[stops - 1]
+    
+    def net_of_lunch(hours):
+        hours = np.where(hours > 5, hours - 1, hours)
+        return np.where(np.isnan(hours), 0.0, np.maximum(hours, 0))
+    
+    in_out = (out_seconds - in_seconds) / 3600
+    in_out = np.where(in_out < 0, in_out + 24, in_out)
+    # Without an OUT the span runs between the first IN and the last punch, in time order
+    to_last = np.abs(last_seconds - in_seconds) / 3600
+    working_hours = np.where(has_in, net_of_lunch(np.where(has_out, in_out, to_last)), 0.0)
+    total_hours = np.where(stops - starts >= 2, net_of_lunch((last_seconds - first_seconds) / 3600), 0.0)
+    
+    log_dates = ordered["log_date"].to_numpy(dtype=object)
+    total_punches = stops - starts
+    summary = pd.DataFrame({
+        "user_id": users[starts],
+        "day": days[starts],
+        "start": starts,
+        "stop": stops,
+        "total_punches": total_punches,
+        "in_punches": np.add.reduceat(is_in.astype(np.int64), starts),
+        "out_punches": np.add.reduceat(is_out.astype(np.int64), starts),
+        "first_in": np.where(has_in, log_dates[first_in], None),
+        "last_out": np.where(has_out, log_dates[last_out], None),
+        "working_hours": working_hours,
+        "total_hours": total_hours,
+        "status": np.where(total_punches > 0, "Present", "Absent").astype(object),
+    }, columns=columns)
+    return summary, ordered
+
+def date_partitions(start_day: str, end_day: str, days: int):
+    """Split the ISO day range ``start_day``..``end_day`` into inclusive ``(first, last)`` spans of ``days`` days"""
+    start = datetime.strptime(start_day, ISO_DAY_FORMAT)
+    end = datetime.strptime(end_day, ISO_DAY_FORMAT)
+    step = timedelta(days=max(days, 1))
+    partitions = []
+    while start <= end:
+        last = min(start + step - timedelta(days=1), end)
+        partitions.append((start.strftime(ISO_DAY_FORMAT), last.strftime(ISO_DAY_FORMAT)))
+        start = last + timedelta(days=1)
+    return partitions
+
+def parse_api_date(value: str) -> str:
+    """Normalize an API date (MM/DD/YYYY as the sheet writes it, or YYYY-MM-DD) to an ISO ``day``"""
+    for date_format in (DOWNLOAD_DATE_FORMAT, ISO_DAY_FORMAT):
+        try:
+            return datetime.strptime(value.strip(), date_format).strftime(ISO_DAY_FORMAT)
+        except ValueError:
+            continue
+    raise HTTPException(status_code=400, detail=f"Invalid date '{value}', expected MM/DD/YYYY or YYYY-MM-DD")
+
+def _bulk_uuid4(count):
+    """Generate ``count`` random UUID4 strings from a single urandom call"""
+    raw = np.frombuffer(os.urandom(16 * count), dtype=np.uint8).reshape(count, 16).copy()
+    raw[:, 6] = (raw[:, 6] & 0x0F) | 0x40  # version 4
+    raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80  # RFC 4122 variant
+    hexed = raw.tobytes().hex()
+    return [
+        f"{hexed[i:i + 8]}-{hexed[i + 8:i + 12]}-{hexed[i + 12:i + 16]}-{hexed[i + 16:i + 20]}-{hexed[i + 20:i + 32]}"
+        for i in range(0, 32 * count, 32)
+    ]
+
+def _frame_to_documents(frame):
+    """Convert a DataFrame to a list of dicts with native Python values.
+    
+    Much faster than ``frame.to_dict("records")``, which boxes every cell.
+    """
+    columns = list(frame.columns)
+    return [dict(zip(columns, values)) for values in zip(*(frame[column].tolist() for column in columns))]
+
+async def ensure_indexes(targets=None):
+    """Create every index in INDEX_REGISTRY, idempotently.
+    
+    ``targets`` overrides the collection used for a name (e.g. the staging
+    generation of a full sync). An existing index with the same keys but
+    different options is rebuilt; other failures are logged and skipped so
+    one bad collection doesn't block the rest.
+    """
+    targets = targets or {}
+    created = []
+    for name, indexes in INDEX_REGISTRY.items():
+        collection = targets.get(name, db[name])
+        for keys, options in indexes:
+            try:
+                try:
+                    created.append(await collection.create_index(keys, **options))
+                except OperationFailure as e:
+                    if e.code not in (85, 86):  # IndexOptionsConflict, IndexKeySpecsConflict
+                        raise
+                    index_name = "_".join(f"{field}_{direction}" for field, direction in keys)
+                    logger.warning(f"Rebuilding index {collection.name}.{index_name}: {e}")
+                    await collection.drop_index(index_name)
+                    created.append(await collection.create_index(keys, **options))
+            except Exception as e:
+                logger.error(f"Could not create index {keys} on {collection.name}: {e}")
+    return created
+
+async def get_index_stats():
+    """$indexStats usage of every registered collection, flagging unregistered and missing indexes"""
+    report = {}
+    for name, indexes in INDEX_REGISTRY.items():
+        collection = db[name]
+        registered = {tuple(tuple(key) for key in keys): options for keys, options in indexes}
+        entries = []
+        async for stat in collection.aggregate([{"$indexStats": {}}]):
+            keys = tuple(tuple(key) for key in stat["key"].items())
+            accesses = stat.get("accesses", {})
+            entries.append({
+                "name": stat["name"],
+                "key": dict(stat["key"]),
+                "ops": accesses.get("ops", 0),
+                "since": accesses.get("since"),
+                "registered": keys in registered or stat["name"] == "_id_",
+            })
+        present = {tuple(entry["key"].items()) for entry in entries}
+        report[name] = {
+            "collection": collection.name,
+            "indexes": sorted(entries, key=lambda entry: entry["ops"], reverse=True),
+            "missing": [dict(keys) for keys in registered if keys not in present],
+        }
+    return report
+
+def encode_cursor(document, fields):
+    """Opaque ``after`` token holding the sort-key values of the last row of a page"""
+    values = [str(document.get(field)) if isinstance(document.get(field), ObjectId) else document.get(field) for field in fields]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+def decode_cursor(token, fields):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        if not isinstance(values, list) or len(values) != len(fields):
+            raise ValueError("cursor does not match this listing")
+        return [ObjectId(value) if field == "_id" else value for field, value in zip(fields, values)]
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+def keyset_filter(fields, values):
+    """Rows strictly after ``values`` in the ascending order of ``fields``.
+    
+    Nulls sort first in MongoDB, so everything non-null is "after" a null key.
+    """
+    branches = []
+    for position, (field, value) in enumerate(zip(fields, values)):
+        branch = {earlier: earlier_value for earlier, earlier_value in zip(fields[:position], values[:position])}
+        branch[field] = {"$ne": None} if value is None else {"$gt": value}
+        branches.append(branch)
+    return branches[0] if len(branches) == 1 else {"$or": branches}
+
+_count_cache = TTLCache(maxsize=COUNT_CACHE_SIZE, ttl=COUNT_CACHE_TTL_SECONDS)
+
+async def count_matching(collection, query, mode="exact"):
+    """total_count for a list endpoint.
+    
+    ``exact`` counts (cached per collection, filter and data version for
+    COUNT_CACHE_TTL_SECONDS), ``estimate`` uses collection metadata when
+    there is no filter and otherwise behaves like ``exact``, ``none`` skips
+    counting.
+    """
+    if mode == "none":
+        return None
+    if mode == "estimate" and not query:
+        return await collection.estimated_document_count()
+    
+    key = (collection.name, json.dumps(query, sort_keys=True, default=str), db.data_version)
+    count = _count_cache.get(key)
+    if count is None:
+        count = _count_cache[key] = await collection.count_documents(query)
+    return count
+
+async def count_distinct(collection, field):
+    """Number of distinct ``field`` values, computed server-side once per data version.
+    
+    Sorting on ``field`` first lets MongoDB answer the ``$group`` with a
+    DISTINCT_SCAN over an index led by ``field`` instead of a collection scan.
+    """
+    key = (collection.name, f"distinct:{field}", db.data_version)
+    count = _count_cache.get(key)
+    if count is None:
+        pipeline = [{"$sort": {field: 1}}, {"$group": {"_id": f"${field}"}}, {"$count": "count"}]
+        rows = await collection.aggregate(pipeline, allowDiskUse=True).to_list(length=1)
+        count = _count_cache[key] = rows[0]["count"] if rows else 0
+    return count
+
+def invalidate_counts(collection):
+    """Drop cached counts of one collection after a write"""
+    for key in [key for key in _count_cache.keys() if key[0] == collection.name]:
+        _count_cache.pop(key, None)
+
+def data_etag(request: Request):
+    """Strong ETag of a read that only changes with ``db.data_version``"""
+    query = json.dumps(sorted(request.query_params.multi_items()))
+    return '"%s"' % hashlib.sha1(f"{request.url.path}?{query}#{db.data_version}".encode()).hexdigest()
+
+def not_modified(request: Request, etag: str):
+    """A 304 response when the client's If-None-Match already names ``etag``, else None"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return None
+    # If-None-Match uses the weak comparison, so W/ prefixes added by proxies still match
+    tags = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    if "*" in tags or etag in tags:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag, "Cache-Control": API_CACHE_CONTROL})
+    return None
+
+def set_validators(response: Response, etag: str):
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = API_CACHE_CONTROL
+
+class ResponseCache:
+    """Encoded JSON bodies of read-heavy endpoints, keyed by path, query and data version.
+    
+    Syncs, rollbacks and employee writes bump ``db.data_version``, so entries
+    of older versions are never served again and just age out of the
+    TTL/size bound. Concurrent misses for one key share a single computation.
+    Each body carries an ETag hashed from its bytes, so a matching
+    If-None-Match gets a 304 without re-sending it.
+    """
+    
+    def __init__(self, maxsize: int, ttl: float):
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._pending = {}
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+    
+    @staticmethod
+    def _encode(content):
+        # Same rendering as JSONResponse
+        return json.dumps(
+            jsonable_encoder(content), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+        ).encode("utf-8")
+    
+    @classmethod
+    def _build(cls, content):
+        body = cls._encode(content)
+        return body, '"%s"' % hashlib.sha1(body).hexdigest()
+    
+    @staticmethod
+    def _response(request, entry, outcome):
+        body, etag = entry
+        if outcome != "BYPASS":
+            unchanged = not_modified(request, etag)
+            if unchanged is not None:
+                unchanged.headers["X-Cache"] = outcome
+                return unchanged
+        response = Response(content=body, media_type="application/json", headers={"X-Cache": outcome})
+        set_validators(response, etag)
+        return response
+    
+    async def _compute(self, key, compute):
+        try:
+            entry = self._entries[key] = self._build(await compute())
+            return entry
+        finally:
+            self._pending.pop(key, None)
+    
+    async def respond(self, request: Request, compute):
+        """Serve the cached body for ``request`` or build it with ``compute()``"""
+        if RESPONSE_CACHE_BYPASS_HEADER in request.headers:
+            self.bypassed += 1
+            return self._response(request, self._build(await compute()), "BYPASS")
+        
+        key = (request.url.path, tuple(sorted(request.query_params.multi_items())), db.data_version)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            return self._response(request, entry, "HIT")
+        
+        self.misses += 1
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = self._pending[key] = asyncio.ensure_future(self._compute(key, compute))
+        return self._response(request, await asyncio.shield(pending), "MISS")
+    
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self._entries.maxsize,
+            "ttl_seconds": self._entries.ttl,
+            "data_version": db.data_version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None
+        }
+
+response_cache = ResponseCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL_SECONDS)
+
+async def refresh_dimension_stats(employees_collection, stats_collection):
+    """Recompute stats_by_dimension from employees: one $group per dimension.
+    
+    Rows are replaced in place and vanished values deleted afterwards, so
+    readers never see an empty collection.
+    """
+    operations, live = [], []
+    for dimension in STATS_DIMENSIONS:
+        pipeline = [{"$group": {
+            "_id": f"${dimension}",
+            "total_employees": {"$sum": 1},
+            "present": {"$sum": {"$cond": [{"$eq": ["$attendance_status", "Present"]}, 1, 0]}},
+            "absent": {"$sum": {"$cond": [{"$eq": ["$attendance_status", "Absent"]}, 1, 0]}}
+        }}]
+        async for group in employees_collection.aggregate(pipeline):
+            key = {"dimension": dimension, "value": group["_id"]}
+            live.append(key)
+            operations.append(ReplaceOne(key, {**key, **{k: group[k] for k in ("total_employees", "present", "absent")}}, upsert=True))
+    
+    if operations:
+        await stats_collection.bulk_write(operations, ordered=False)
+    await stats_collection.delete_many({"$nor": live} if live else {})
+
+def _dimension_deltas(employee, sign):
+    """$inc updates adding (sign=1) or removing (sign=-1) one employee from its stats rows"""
+    status = employee.get("attendance_status")
+    increments = {
+        "total_employees": sign,
+        "present": sign if status == "Present" else 0,
+        "absent": sign if status == "Absent" else 0,
+    }
+    return [
+        UpdateOne({"dimension": dimension, "value": employee.get(dimension)}, {"$inc": increments}, upsert=True)
+        for dimension in STATS_DIMENSIONS
+    ]
+
+async def apply_dimension_deltas(before=None, after=None):
+    """Move one employee's contribution in stats_by_dimension after a create/update/delete"""
+    fields = (*STATS_DIMENSIONS, "attendance_status")
+    if before and after and all(before.get(field) == after.get(field) for field in fields):
+        return
+    if await db.stats_by_dimension.find_one({}, {"_id": 1}) is None:
+        # Never materialized (e.g. data from before stats_by_dimension): deltas would
+        # leave rows for this employee only, so build everything from the employees
+        await refresh_dimension_stats(db.employees, db.stats_by_dimension)
+        return
+    operations = (_dimension_deltas(before, -1) if before else []) + (_dimension_deltas(after, 1) if after else [])
+    await db.stats_by_dimension.bulk_write(operations, ordered=False)
+    await db.stats_by_dimension.delete_many({"total_employees": {"$lte": 0}})
+
+async def get_dimension_stats(dimension):
+    """Materialized per-value stats, rebuilt on the spot if they were never computed"""
+    rows = await db.stats_by_dimension.find({"dimension": dimension}, {"_id": 0}).to_list(length=None)
+    if not rows and await db.employees.estimated_document_count() > 0:
+        await refresh_dimension_stats(db.employees, db.stats_by_dimension)
+        rows = await db.stats_by_dimension.find({"dimension": dimension}, {"_id": 0}).to_list(length=None)
+    
+    result = []
+    for row in rows:
+        total = row["total_employees"]
+        present = row["present"]
+        absent = row["absent"]
+        
+        result.append({
+            dimension: row["value"],
+            "total_employees": total,
+            "present": present,
+            "absent": absent,
+            "present_percentage": round((present / total * 100), 2) if total > 0 else 0,
+            "absent_percentage": round((absent / total * 100), 2) if total > 0 else 0
+        })
+    return result
+
 def convert_object_id(obj):
     """Convert MongoDB ObjectId to string"""
     from bson import ObjectId
@@ -650,6 +2499,69 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+class PasswordHasher:
+    """Runs bcrypt in a small thread pool so logins never block the event loop.
+    
+    bcrypt releases the GIL, so hashes run in parallel up to
+    PASSWORD_HASH_WORKERS; callers beyond that wait on a semaphore and the
+    time spent waiting is recorded as queue time.
+    """
+    
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._slots = asyncio.Semaphore(workers)
+        self._waiting = 0
+        self._in_flight = 0
+        self._completed = 0
+        self._queue_seconds = 0.0
+        self._max_queue_seconds = 0.0
+        self._hash_seconds = 0.0
+    
+    async def _run(self, func, *args):
+        queued_at = time.monotonic()
+        self._waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self._waiting -= 1
+        
+        started = time.monotonic()
+        waited = started - queued_at
+        self._queue_seconds += waited
+        self._max_queue_seconds = max(self._max_queue_seconds, waited)
+        self._in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            self._in_flight -= 1
+            self._slots.release()
+            self._completed += 1
+            self._hash_seconds += time.monotonic() - started
+    
+    async def verify(self, plain_password, hashed_password):
+        return await self._run(verify_password, plain_password, hashed_password)
+    
+    async def hash(self, password):
+        return await self._run(get_password_hash, password)
+    
+    def stats(self):
+        completed = self._completed or 1
+        return {
+            "workers": self.workers,
+            "in_flight": self._in_flight,
+            "waiting": self._waiting,
+            "completed": self._completed,
+            "avg_queue_ms": round(self._queue_seconds / completed * 1000, 2),
+            "max_queue_ms": round(self._max_queue_seconds * 1000, 2),
+            "avg_hash_ms": round(self._hash_seconds / completed * 1000, 2)
+        }
+    
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+password_hasher = PasswordHasher(PASSWORD_HASH_WORKERS)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -660,6 +2572,31 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def create_user_token(user: dict):
+    """Access token carrying the claims the API needs: username, user id, role and token version"""
+    return create_access_token(data={
+        "sub": user["username"],
+        "uid": user.get("id"),
+        "role": user.get("role"),
+        "ver": user.get("token_version", 0)
+    })
+
+# Fields needed to check a token's version and to authorize tokens issued without role claims
+USER_AUTH_FIELDS = {"_id": 0, "id": 1, "username": 1, "role": 1, "token_version": 1}
+
+# (username, token version) -> user auth record; a hit authenticates without a database query
+_user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL_SECONDS)
+
+def invalidate_user(username: str):
+    """Forget cached records of a user after it changed"""
+    for key in [key for key in _user_cache.keys() if key[0] == username]:
+        _user_cache.pop(key, None)
+
+async def revoke_user_tokens(username: str):
+    """Invalidate every token issued to a user so far"""
+    await db.users.update_one({"username": username}, {"$inc": {"token_version": 1}})
+    invalidate_user(username)
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -674,82 +2611,150 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     except JWTError:
         raise credentials_exception
     
-    user = await db.users.find_one({"username": username})
+    # Tokens issued before versioning carry no "ver" and match version 0
+    key = (username, payload.get("ver", 0))
+    user = _user_cache.get(key)
     if user is None:
-        raise credentials_exception
+        # Only the revocation check needs the database
+        user = await db.users.find_one({"username": username}, USER_AUTH_FIELDS)
+        if user is None or user.get("token_version", 0) != key[1]:
+            raise credentials_exception
+        _user_cache[key] = user
     
-    return convert_object_id(user)
+    if "role" in payload:
+        # Authorize from the token's own claims; role changes take effect through revoke_user_tokens
+        return {"id": payload.get("uid"), "username": username, "role": payload["role"]}
+    # Tokens issued before the claims existed
+    return {field: user.get(field) for field in ("id", "username", "role")}
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background syncs and release shared clients"""
+    await sync_scheduler.stop()
+    await db.stop_refresh()
+    await sheets_service.close()
+    password_hasher.shutdown()
+
+async def ensure_default_admin():
+    """Create the default admin user on an empty users collection"""
+    admin_user = await db.users.find_one({"username": "admin"})
+    if not admin_user:
+        admin_data = {
+            "id": str(uuid.uuid4()),
+            "username": "admin",
+            "email": "admin@company.com",
+            "password": await password_hasher.hash("admin123"),
+            "role": "admin",
+            "created_at": datetime.now()
+        }
+        try:
+            await db.users.insert_one(admin_data)
+        except DuplicateKeyError:
+            return  # created by another worker booting at the same time
+        invalidate_user("admin")
+        logger.info("Default admin user created")
 
 # Initialize database with default user
 @app.on_event("startup")
 async def startup_event():
-    """Initialize database with default user and sample data"""
-    try:
-        # Create default admin user
-        admin_user = await db.users.find_one({"username": "admin"})
-        if not admin_user:
-            admin_data = {
-                "id": str(uuid.uuid4()),
-                "username": "admin",
-                "email": "admin@company.com",
-                "password": get_password_hash("admin123"),
-                "role": "admin",
-                "created_at": datetime.now()
-            }
-            await db.users.insert_one(admin_data)
-            logger.info("Default admin user created")
-        
-        # Check if we have employee data
-        employee_count = await db.employees.count_documents({})
-        if employee_count == 0:
-            logger.info("No employees found, syncing from Google Sheets...")
-            employees = await sheets_service.sync_data_from_google_sheets()
-            if employees:
-                await db.employees.insert_many(employees)
-                logger.info(f"Synced {len(employees)} employees from Google Sheets")
-        
-        logger.info("Database initialization completed successfully")
-    except Exception as e:
-        logger.error(f"Error during database initialization: {e}")
+    """Start the background tasks; bootstrapping and loading data run (and retry) in the background"""
+    db.start_refresh()
+    # Loading or migrating data can take minutes: readiness reports when it's done
+    sync_scheduler.start_initial_load()
+    sync_scheduler.start()
+    logger.info("Background initialization started")
+
+# Health probes
+_readiness_cache = {"expires": 0.0, "result": None}
+
+async def check_readiness():
+    """DB reachability and initial-load state, reused for HEALTH_CACHE_SECONDS"""
+    now = time.monotonic()
+    if _readiness_cache["result"] is None or now >= _readiness_cache["expires"]:
+        checks = {"initial_load": sync_scheduler.initial_load["status"]}
+        try:
+            await asyncio.wait_for(client.admin.command("ping"), timeout=HEALTH_DB_TIMEOUT_SECONDS)
+            checks["database"] = "ok"
+        except Exception as e:
+            checks["database"] = f"unreachable: {e.__class__.__name__}"
+        ready = checks["database"] == "ok" and checks["initial_load"] == "completed"
+        _readiness_cache.update(expires=now + HEALTH_CACHE_SECONDS, result=(ready, checks))
+    return _readiness_cache["result"]
+
+@app.get("/healthz")
+async def liveness_probe():
+    """Liveness: the process is up and serving requests"""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readiness_probe():
+    """Readiness: MongoDB is reachable and the initial data load has finished"""
+    ready, checks = await check_readiness()
+    return JSONResponse(
+        status_code=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"status": "ready" if ready else "not_ready", "checks": checks}
+    )
 
 # Auth routes
 @api_router.post("/auth/login", response_model=dict)
 async def login(user_credentials: UserLogin):
     """Login endpoint"""
     user = await db.users.find_one({"username": user_credentials.username})
-    if not user or not verify_password(user_credentials.password, user["password"]):
+    if not user or not await password_hasher.verify(user_credentials.password, user["password"]):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    access_token = create_access_token(data={"sub": user["username"]})
+    access_token = create_user_token(user)
     
     # Convert ObjectId to string for JSON serialization
     user_data = {k: str(v) if k == "_id" else v for k, v in user.items()}
     
     return {"access_token": access_token, "token_type": "bearer", "user": user_data}
 
+@api_router.post("/auth/revoke")
+async def revoke_tokens(current_user: dict = Depends(get_current_user)):
+    """Sign out everywhere: invalidate every token issued to the current user"""
+    await revoke_user_tokens(current_user["username"])
+    return {"message": "All tokens revoked"}
+
 # Employee routes
 @api_router.get("/employees")
 async def get_employees(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
     search: Optional[str] = None,
     department: Optional[str] = None,
     site: Optional[str] = None,
     attendance_status: Optional[str] = None,
+    after: Optional[str] = None,
+    count: str = "exact",
     current_user: dict = Depends(get_current_user)
 ):
-    """Get all employees with optional filtering"""
+    """Get employees ordered by employee_id with optional filtering.
+    
+    Pass ``next_cursor`` back as ``after`` to page in constant time; ``skip``
+    still works for small offsets. ``count`` is exact, estimate or none.
+    Answers 304 when If-None-Match carries the ETag of the current data.
+    """
+    if count not in COUNT_MODES:
+        raise HTTPException(status_code=400, detail=f"count must be one of: {', '.join(COUNT_MODES)}")
+    
+    etag = data_etag(request)
+    unchanged = not_modified(request, etag)
+    if unchanged is not None:
+        return unchanged
+    set_validators(response, etag)
+    
     query = {}
     
     if search:
-        query["$or"] = [
-            {"name": {"$regex": search, "$options": "i"}},
-            {"employee_id": {"$regex": search, "$options": "i"}}
-        ]
+        await employee_search_index.ensure_fresh()
+        query["employee_id"] = {"$in": [match["employee_id"] for match in employee_search_index.search(search)]}
     
     if department:
         query["department"] = department
@@ -760,14 +2765,21 @@ async def get_employees(
     if attendance_status:
         query["attendance_status"] = attendance_status
     
-    employees = await db.employees.find(query).skip(skip).limit(limit).to_list(length=limit)
-    total_count = await db.employees.count_documents(query)
+    page_query = query
+    if after:
+        page_query = {"$and": [query, keyset_filter(EMPLOYEE_PAGE_SORT, decode_cursor(after, EMPLOYEE_PAGE_SORT))]}
+        skip = 0
+    
+    cursor = db.employees.find(page_query).sort([(field, 1) for field in EMPLOYEE_PAGE_SORT])
+    employees = await cursor.skip(skip).limit(limit).to_list(length=limit)
+    total_count = await count_matching(db.employees, query, count)
     
     return {
         "employees": convert_object_id(employees),
         "total_count": total_count,
         "skip": skip,
-        "limit": limit
+        "limit": limit,
+        "next_cursor": encode_cursor(employees[-1], EMPLOYEE_PAGE_SORT) if limit and len(employees) == limit else None
     }
 
 @api_router.get("/employees/suggestions")
@@ -782,15 +2794,9 @@ async def get_employee_suggestions(
         return []
     
     try:
-        # First try to find in employees collection
-        employee_query = {
-            "$or": [
-                {"employee_id": {"$regex": query, "$options": "i"}},
-                {"name": {"$regex": query, "$options": "i"}}
-            ]
-        }
-        
-        employees = await db.employees.find(employee_query).limit(limit).to_list(length=limit)
+        # Ranked matches straight from the in-process search index
+        await employee_search_index.ensure_fresh()
+        employees = employee_search_index.search(query, limit)
         
         suggestions = []
         for emp in employees:
@@ -820,17 +2826,12 @@ async def search_employee_by_code(
     
     # Get today's punch details
     from datetime import datetime
-    today = datetime.now().strftime("%m/%d/%Y")
-    
-    query = {
-        "user_id": code,
-        "download_date": today
-    }
+    today = datetime.now().strftime(ISO_DAY_FORMAT)
     
-    today_logs = await db.attendance_logs.find(query).sort("log_date", 1).to_list(length=None)
+    rollup = await db.daily_attendance.find_one({"user_id": code, "day": today}, {"_id": 0, "attendance": 1})
     
-    if today_logs:
-        employee_details["today_punch_details"] = sheets_service.get_daily_punch_details(today_logs)
+    if rollup:
+        employee_details["today_punch_details"] = rollup["attendance"]
     else:
         employee_details["today_punch_details"] = {
             "first_in": None,
@@ -843,6 +2844,72 @@ async def search_employee_by_code(
     
     return employee_details
 
+async def _stream_date_wise(envelope, records, ndjson, partitions):
+    """Encode date-wise records as they arrive: NDJSON lines, or ``envelope`` with a streamed ``data`` array.
+    
+    The per-partition timings are known only once every record is out: the JSON
+    form ends with them, NDJSON ends with a ``{"_meta": ...}`` line holding them.
+    """
+    buffer, count = [], 0
+    if not ndjson:
+        buffer.append(json.dumps(envelope)[:-1] + ',"data":[')
+    try:
+        async for record in records:
+            line = json.dumps(record, separators=(",", ":"))
+            buffer.append(line + "\n" if ndjson else ("," if count else "") + line)
+            count += 1
+            if len(buffer) >= STREAM_RECORDS_PER_CHUNK:
+                yield "".join(buffer)
+                buffer = []
+    except Exception as e:
+        # Headers are gone already; aborting the body is the only way left to signal failure
+        logger.error(f"Error streaming date-wise employee data: {e}")
+        raise
+    if ndjson:
+        buffer.append(json.dumps({"_meta": {"total_records": count, "partitions": partitions}}, separators=(",", ":")) + "\n")
+    else:
+        buffer.append(f'],"total_records":{count},"partitions":{json.dumps(partitions)}}}')
+    yield "".join(buffer)
+
+# Declared before /employees/{employee_id}, which would otherwise capture "date-wise"
+@api_router.get("/employees/date-wise")
+async def get_employees_date_wise(
+    start_date: str,
+    end_date: Optional[str] = None,
+    employee_id: Optional[str] = None,
+    format: str = "json",
+    current_user: dict = Depends(get_current_user)
+):
+    """Get comprehensive date-wise employee attendance data.
+    
+    Records are streamed as they are read, by date and then employee:
+    ``format=json`` keeps the usual envelope (``total_records`` and the
+    per-partition ``partitions`` timings come after ``data``),
+    ``format=ndjson`` sends one record per line and a final ``_meta`` line
+    with the same totals and timings.
+    """
+    if format not in DATE_WISE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(DATE_WISE_FORMATS)}")
+    if not end_date:
+        end_date = start_date
+    
+    partitions = []
+    records = sheets_service.iter_employees_date_wise(
+        parse_api_date(start_date), parse_api_date(end_date), employee_id, timings=partitions
+    )
+    envelope = {
+        "date_range": {
+            "start_date": start_date,
+            "end_date": end_date
+        },
+        "employee_filter": employee_id
+    }
+    ndjson = format == "ndjson"
+    return StreamingResponse(
+        _stream_date_wise(envelope, records, ndjson, partitions),
+        media_type="application/x-ndjson" if ndjson else "application/json"
+    )
+
 @api_router.get("/employees/{employee_id}")
 async def get_employee(employee_id: str, current_user: dict = Depends(get_current_user)):
     """Get employee by ID"""
@@ -855,6 +2922,8 @@ async def get_employee(employee_id: str, current_user: dict = Depends(get_curren
 @api_router.post("/employees")
 async def create_employee(employee: EmployeeCreate, current_user: dict = Depends(get_current_user)):
     """Create a new employee"""
+    # Write to the live generation even if another worker swapped it since our last refresh
+    await db.refresh_generations()
     # Check if employee ID already exists
     existing_employee = await db.employees.find_one({"employee_id": employee.employee_id})
     if existing_employee:
@@ -871,44 +2940,79 @@ async def create_employee(employee: EmployeeCreate, current_user: dict = Depends
         "updated_at": datetime.now()
     }
     
-    await db.employees.insert_one(employee_data)
+    try:
+        await db.employees.insert_one(employee_data)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Employee ID already exists")
+    employee_search_index.add(employee_data)
+    employee_directory.add(employee_data)
+    invalidate_counts(db.employees)
+    await apply_dimension_deltas(after=employee_data)
+    await db.bump_data_version()
     return convert_object_id(employee_data)
 
 @api_router.put("/employees/{employee_id}")
 async def update_employee(employee_id: str, employee_update: EmployeeUpdate, current_user: dict = Depends(get_current_user)):
     """Update an employee"""
+    await db.refresh_generations()
     update_data = {k: v for k, v in employee_update.dict().items() if v is not None}
     if not update_data:
         raise HTTPException(status_code=400, detail="No data provided for update")
     
     update_data["updated_at"] = datetime.now()
     
-    result = await db.employees.update_one(
+    previous = await db.employees.find_one_and_update(
         {"$or": [{"id": employee_id}, {"employee_id": employee_id}]},
-        {"$set": update_data}
+        {"$set": update_data},
+        return_document=ReturnDocument.BEFORE
     )
     
-    if result.matched_count == 0:
+    if previous is None:
         raise HTTPException(status_code=404, detail="Employee not found")
     
+    employee = {**previous, **update_data}
+    employee_search_index.add(employee)
+    employee_directory.add(employee)
+    invalidate_counts(db.employees)
+    await apply_dimension_deltas(before=previous, after=employee)
+    await db.bump_data_version()
+    
     return {"message": "Employee updated successfully"}
 
 @api_router.delete("/employees/{employee_id}")
 async def delete_employee(employee_id: str, current_user: dict = Depends(get_current_user)):
     """Delete an employee"""
-    result = await db.employees.delete_one({"$or": [{"id": employee_id}, {"employee_id": employee_id}]})
-    if result.deleted_count == 0:
+    await db.refresh_generations()
+    employee = await db.employees.find_one_and_delete({"$or": [{"id": employee_id}, {"employee_id": employee_id}]})
+    if employee is None:
         raise HTTPException(status_code=404, detail="Employee not found")
     
+    employee_search_index.remove(employee.get("employee_id"))
+    employee_directory.remove(employee.get("employee_id"))
+    invalidate_counts(db.employees)
+    await apply_dimension_deltas(before=employee)
+    await db.bump_data_version()
+    
     return {"message": "Employee deleted successfully"}
 
-# Statistics routes
-@api_router.get("/stats/attendance")
-async def get_attendance_stats(current_user: dict = Depends(get_current_user)):
-    """Get overall attendance statistics"""
-    total_employees = await db.employees.count_documents({})
-    present = await db.employees.count_documents({"attendance_status": "Present"})
-    absent = await db.employees.count_documents({"attendance_status": "Absent"})
+# Statistics routes; dashboards poll these, so responses go through response_cache
+async def compute_attendance_stats():
+    """Overall attendance statistics"""
+    # One pass over the attendance_status index instead of three counts
+    pipeline = [
+        {"$sort": {"attendance_status": 1}},
+        {"$project": {"_id": 0, "attendance_status": 1}},
+        {"$facet": {
+            "total": [{"$count": "count"}],
+            "by_status": [{"$group": {"_id": "$attendance_status", "count": {"$sum": 1}}}]
+        }}
+    ]
+    facets = (await db.employees.aggregate(pipeline).to_list(length=1))[0]
+    by_status = {entry["_id"]: entry["count"] for entry in facets["by_status"]}
+    
+    total_employees = facets["total"][0]["count"] if facets["total"] else 0
+    present = by_status.get("Present", 0)
+    absent = by_status.get("Absent", 0)
     
     present_percentage = (present / total_employees * 100) if total_employees > 0 else 0
     absent_percentage = (absent / total_employees * 100) if total_employees > 0 else 0
@@ -921,94 +3025,35 @@ async def get_attendance_stats(current_user: dict = Depends(get_current_user)):
         "absent_percentage": round(absent_percentage, 2)
     }
 
+@api_router.get("/stats/attendance")
+async def get_attendance_stats(request: Request, current_user: dict = Depends(get_current_user)):
+    """Get overall attendance statistics"""
+    return await response_cache.respond(request, compute_attendance_stats)
+
 @api_router.get("/stats/departments")
-async def get_department_stats(current_user: dict = Depends(get_current_user)):
+async def get_department_stats(request: Request, current_user: dict = Depends(get_current_user)):
     """Get department-wise statistics"""
-    pipeline = [
-        {
-            "$group": {
-                "_id": "$department",
-                "total_employees": {"$sum": 1},
-                "present": {"$sum": {"$cond": [{"$eq": ["$attendance_status", "Present"]}, 1, 0]}},
-                "absent": {"$sum": {"$cond": [{"$eq": ["$attendance_status", "Absent"]}, 1, 0]}}
-            }
-        }
-    ]
-    
-    departments = await db.employees.aggregate(pipeline).to_list(length=None)
-    
-    result = []
-    for dept in departments:
-        total = dept["total_employees"]
-        present = dept["present"]
-        absent = dept["absent"]
-        
-        result.append({
-            "department": dept["_id"],
-            "total_employees": total,
-            "present": present,
-            "absent": absent,
-            "present_percentage": round((present / total * 100), 2) if total > 0 else 0,
-            "absent_percentage": round((absent / total * 100), 2) if total > 0 else 0
-        })
-    
-    return result
+    return await response_cache.respond(request, lambda: get_dimension_stats("department"))
 
 @api_router.get("/stats/sites")
-async def get_site_stats(current_user: dict = Depends(get_current_user)):
+async def get_site_stats(request: Request, current_user: dict = Depends(get_current_user)):
     """Get site-wise statistics"""
-    pipeline = [
-        {
-            "$group": {
-                "_id": "$site",
-                "total_employees": {"$sum": 1},
-                "present": {"$sum": {"$cond": [{"$eq": ["$attendance_status", "Present"]}, 1, 0]}},
-                "absent": {"$sum": {"$cond": [{"$eq": ["$attendance_status", "Absent"]}, 1, 0]}}
-            }
-        }
-    ]
-    
-    sites = await db.employees.aggregate(pipeline).to_list(length=None)
-    
-    result = []
-    for site in sites:
-        total = site["total_employees"]
-        present = site["present"]
-        absent = site["absent"]
-        
-        result.append({
-            "site": site["_id"],
-            "total_employees": total,
-            "present": present,
-            "absent": absent,
-            "present_percentage": round((present / total * 100), 2) if total > 0 else 0,
-            "absent_percentage": round((absent / total * 100), 2) if total > 0 else 0
-        })
-    
-    return result
+    return await response_cache.respond(request, lambda: get_dimension_stats("site"))
 
-@api_router.get("/stats/daily-attendance")
-async def get_daily_attendance_stats(
-    date: Optional[str] = None,
-    current_user: dict = Depends(get_current_user)
-):
-    """Get daily attendance statistics for a specific date"""
-    if not date:
+async def compute_daily_attendance_stats(date: Optional[str] = None):
+    """Daily attendance statistics for a date, by default the most recent one with logs"""
+    if date:
+        day = parse_api_date(date)
+    else:
         # If no date provided, use the most recent date with attendance logs
-        recent_dates = await db.attendance_logs.distinct("download_date")
-        if recent_dates:
-            # Sort dates and get the most recent
-            try:
-                sorted_dates = sorted(recent_dates, key=lambda x: datetime.strptime(x, "%m/%d/%Y"), reverse=True)
-                date = sorted_dates[0]
-            except:
-                # If date parsing fails, use the first date
-                date = recent_dates[0]
+        latest = await db.daily_attendance.find_one({}, {"_id": 0, "day": 1, "date": 1}, sort=[("day", -1)])
+        if latest:
+            day, date = latest["day"], latest["date"]
         else:
             # If no attendance logs exist, use today's date
-            date = datetime.now().strftime("%m/%d/%Y")
+            day, date = datetime.now().strftime(ISO_DAY_FORMAT), datetime.now().strftime(DOWNLOAD_DATE_FORMAT)
     
-    stats = await sheets_service.get_daily_attendance_stats(date)
+    stats = await sheets_service.get_daily_attendance_stats(day)
     
     # Add percentages (removed half_day_percentage)
     total = stats["total_employees"]
@@ -1024,6 +3069,15 @@ async def get_daily_attendance_stats(
     stats["date"] = date
     return stats
 
+@api_router.get("/stats/daily-attendance")
+async def get_daily_attendance_stats(
+    request: Request,
+    date: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Get daily attendance statistics for a specific date"""
+    return await response_cache.respond(request, lambda: compute_daily_attendance_stats(date))
+
 @api_router.get("/employees/{employee_id}/punch-details")
 async def get_employee_punch_details(
     employee_id: str,
@@ -1033,24 +3087,15 @@ async def get_employee_punch_details(
     """Get detailed punch information for an employee on a specific date"""
     if not date:
         from datetime import datetime
-        date = datetime.now().strftime("%m/%d/%Y")
-    
-    # Get attendance logs for the specific date
-    query = {
-        "user_id": employee_id,
-        "download_date": date
-    }
+        date = datetime.now().strftime(DOWNLOAD_DATE_FORMAT)
     
-    logs = await db.attendance_logs.find(query).to_list(length=None)
+    # Detailed punch information is precomputed per (employee, date) during sync
+    rollup = await db.daily_attendance.find_one({"user_id": employee_id, "day": parse_api_date(date)}, {"_id": 0, "attendance": 1})
     
-    if not logs:
+    if not rollup:
         raise HTTPException(status_code=404, detail="No attendance data found for this employee on the specified date")
     
-    # Convert ObjectId to string
-    logs = convert_object_id(logs)
-    
-    # Get detailed punch information
-    punch_details = sheets_service.get_daily_punch_details(logs)
+    punch_details = rollup["attendance"]
     
     # Add employee basic info
     employee_info = await sheets_service.get_employee_details(employee_id)
@@ -1069,39 +3114,31 @@ async def get_daily_attendance_summary(
     """Get daily attendance summary with IN/OUT punch details"""
     if not date:
         from datetime import datetime
-        date = datetime.now().strftime("%m/%d/%Y")
-    
-    # Get all logs for the date
-    query = {"download_date": date}
-    logs = await db.attendance_logs.find(query).to_list(length=None)
-    
-    # Convert ObjectId to string
-    logs = convert_object_id(logs)
+        date = datetime.now().strftime(DOWNLOAD_DATE_FORMAT)
     
-    # Group by user_id
-    user_logs = {}
-    for log in logs:
-        user_id = log.get("user_id")
-        if user_id not in user_logs:
-            user_logs[user_id] = []
-        user_logs[user_id].append(log)
+    # One precomputed rollup per employee for the date
+    rollups = await db.daily_attendance.find(
+        {"day": parse_api_date(date)}, {"_id": 0, "user_id": 1, "site": 1, "attendance": 1}
+    ).to_list(length=None)
+    await employee_directory.ensure_fresh()
     
     # Process each employee's attendance
     attendance_summary = []
-    for user_id, user_logs_list in user_logs.items():
-        punch_details = sheets_service.get_daily_punch_details(user_logs_list)
+    for rollup in rollups:
+        user_id = rollup["user_id"]
+        employee = employee_directory.lookup(user_id)
         
         # Get employee basic info
         employee_info = {
             "employee_id": user_id,
-            "name": sheets_service.get_employee_name(user_id),
-            "department": "General Department",
-            "site": sheets_service.get_device_location(user_logs_list[0].get("device_id", "")) if user_logs_list else "Unknown"
+            "name": employee["name"],
+            "department": employee["department"],
+            "site": rollup["site"]
         }
         
         attendance_summary.append({
             "employee": employee_info,
-            "attendance": punch_details
+            "attendance": rollup["attendance"]
         })
     
     # Sort by employee name
@@ -1113,41 +3150,35 @@ async def get_daily_attendance_summary(
         "attendance_summary": attendance_summary
     }
 
-# NEW: Date-wise employee data endpoint
-@api_router.get("/employees/date-wise")
-async def get_employees_date_wise(
-    start_date: str,
-    end_date: Optional[str] = None,
-    employee_id: Optional[str] = None,
-    current_user: dict = Depends(get_current_user)
-):
-    """Get comprehensive date-wise employee attendance data"""
-    if not end_date:
-        end_date = start_date
-    
-    data = await sheets_service.get_employees_date_wise_data(start_date, end_date, employee_id)
-    
-    return {
-        "date_range": {
-            "start_date": start_date,
-            "end_date": end_date
-        },
-        "employee_filter": employee_id,
-        "total_records": len(data),
-        "data": data
-    }
-
 # Attendance logs routes
 @api_router.get("/attendance-logs")
 async def get_attendance_logs(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
     user_id: Optional[str] = None,
     device_id: Optional[str] = None,
     date: Optional[str] = None,
+    after: Optional[str] = None,
+    count: str = "exact",
     current_user: dict = Depends(get_current_user)
 ):
-    """Get attendance logs with optional filtering"""
+    """Get attendance logs in punch order with optional filtering.
+    
+    Pass ``next_cursor`` back as ``after`` to page in constant time; ``skip``
+    still works for small offsets. ``count`` is exact, estimate or none.
+    Answers 304 when If-None-Match carries the ETag of the current data.
+    """
+    if count not in COUNT_MODES:
+        raise HTTPException(status_code=400, detail=f"count must be one of: {', '.join(COUNT_MODES)}")
+    
+    etag = data_etag(request)
+    unchanged = not_modified(request, etag)
+    if unchanged is not None:
+        return unchanged
+    set_validators(response, etag)
+    
     query = {}
     
     if user_id:
@@ -1157,79 +3188,186 @@ async def get_attendance_logs(
         query["device_id"] = device_id
     
     if date:
-        query["download_date"] = date
+        query["day"] = parse_api_date(date)
+    
+    page_query = query
+    if after:
+        page_query = {"$and": [query, keyset_filter(ATTENDANCE_LOG_PAGE_SORT, decode_cursor(after, ATTENDANCE_LOG_PAGE_SORT))]}
+        skip = 0
     
-    logs = await db.attendance_logs.find(query).skip(skip).limit(limit).to_list(length=limit)
-    total_count = await db.attendance_logs.count_documents(query)
+    cursor = db.attendance_logs.find(page_query).sort([(field, 1) for field in ATTENDANCE_LOG_PAGE_SORT])
+    logs = await cursor.skip(skip).limit(limit).to_list(length=limit)
+    total_count = await count_matching(db.attendance_logs, query, count)
+    next_cursor = encode_cursor(logs[-1], ATTENDANCE_LOG_PAGE_SORT) if limit and len(logs) == limit else None
     
     return {
         "logs": convert_object_id(logs),
         "total_count": total_count,
         "skip": skip,
-        "limit": limit
+        "limit": limit,
+        "next_cursor": next_cursor
+    }
+
+async def compute_attendance_logs_stats():
+    """Attendance log statistics"""
+    # Recent logs = last 24 hours
+    yesterday = datetime.now() - timedelta(days=1)
+    
+    # One scan feeds the four counts; the distinct counts walk the (user_id, ...)
+    # and (device_id, ...) indexes instead, which a $facet sub-pipeline can't use
+    pipeline = [
+        {"$project": {"_id": 0, "c1": 1, "created_at": 1}},
+        {"$facet": {
+            "totals": [{"$group": {
+                "_id": None,
+                "total_logs": {"$sum": 1},
+                "in_logs": {"$sum": {"$cond": [{"$eq": ["$c1", "in"]}, 1, 0]}},
+                "out_logs": {"$sum": {"$cond": [{"$eq": ["$c1", "out"]}, 1, 0]}},
+                "recent_logs": {"$sum": {"$cond": [{"$gte": ["$created_at", yesterday]}, 1, 0]}}
+            }}]
+        }}
+    ]
+    facets, unique_users, unique_devices = await asyncio.gather(
+        db.attendance_logs.aggregate(pipeline, allowDiskUse=True).to_list(length=1),
+        count_distinct(db.attendance_logs, "user_id"),
+        count_distinct(db.attendance_logs, "device_id"),
+    )
+    totals = facets[0]["totals"][0] if facets[0]["totals"] else {}
+    
+    return {
+        "total_logs": totals.get("total_logs", 0),
+        "unique_users": unique_users,
+        "unique_devices": unique_devices,
+        "in_logs": totals.get("in_logs", 0),
+        "out_logs": totals.get("out_logs", 0),
+        "recent_logs": totals.get("recent_logs", 0),
+        "device_locations": sheets_service.device_locations
     }
 
 @api_router.get("/attendance-logs/stats")
-async def get_attendance_logs_stats(current_user: dict = Depends(get_current_user)):
+async def get_attendance_logs_stats(request: Request, current_user: dict = Depends(get_current_user)):
     """Get attendance logs statistics"""
-    total_logs = await db.attendance_logs.count_documents({})
-    
-    # Get unique users
-    unique_users = await db.attendance_logs.distinct("user_id")
+    return await response_cache.respond(request, compute_attendance_logs_stats)
+
+@api_router.post("/sync/google-sheets", status_code=status.HTTP_202_ACCEPTED)
+async def sync_google_sheets_data(mode: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+    """Queue a Google Sheets data sync (mode: incremental or full) and return its job id"""
+    if mode and mode not in SYNC_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of: {', '.join(SYNC_MODES)}")
     
-    # Get unique devices
-    unique_devices = await db.attendance_logs.distinct("device_id")
+    try:
+        job, created = await sync_scheduler.enqueue("manual", mode=mode, requested_by=current_user.get("username"))
+    except Exception as e:
+        logger.error(f"Error queueing Google Sheets sync: {e}")
+        raise HTTPException(status_code=500, detail="Failed to queue sync")
     
-    # Get logs by direction
-    in_logs = await db.attendance_logs.count_documents({"c1": "in"})
-    out_logs = await db.attendance_logs.count_documents({"c1": "out"})
+    return {
+        "message": "Sync job started" if created else "A sync is already running",
+        "job_id": job.get("id"),
+        "status": job.get("status"),
+        "already_running": not created
+    }
+
+class IngestImportRequest(BaseModel):
+    path: str
+    format: Optional[str] = None
+    mode: Optional[str] = None
+
+@api_router.post("/sync/import", status_code=status.HTTP_202_ACCEPTED)
+async def import_ingest_file(request: IngestImportRequest, current_user: dict = Depends(get_current_user)):
+    """Queue an ingest of a CSV, Parquet or NDJSON file under INGEST_DATA_DIR (admin only)"""
+    if current_user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    if request.mode and request.mode not in SYNC_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of: {', '.join(SYNC_MODES)}")
+    if request.format and request.format not in INGEST_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(INGEST_FORMATS)}")
+    
+    path = (INGEST_DATA_DIR / request.path).resolve()
+    if INGEST_DATA_DIR not in path.parents or not path.is_file():
+        raise HTTPException(status_code=404, detail="File not found in the ingest directory")
     
-    # Get recent logs (last 24 hours)
-    yesterday = datetime.now() - timedelta(days=1)
-    recent_logs = await db.attendance_logs.count_documents({
-        "created_at": {"$gte": yesterday}
-    })
+    try:
+        source = build_ingest_source(str(path), fmt=request.format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
+    job, created = await sync_scheduler.enqueue(
+        "import", mode=request.mode, requested_by=current_user.get("username"), source=source
+    )
     return {
-        "total_logs": total_logs,
-        "unique_users": len(unique_users),
-        "unique_devices": len(unique_devices),
-        "in_logs": in_logs,
-        "out_logs": out_logs,
-        "recent_logs": recent_logs,
-        "device_locations": sheets_service.device_locations
+        "message": "Import job started" if created else "A sync is already running",
+        "job_id": job.get("id"),
+        "status": job.get("status"),
+        "already_running": not created
     }
 
-@api_router.post("/sync/google-sheets")
-async def sync_google_sheets_data(current_user: dict = Depends(get_current_user)):
-    """Manually trigger Google Sheets data sync"""
+@api_router.get("/sync/jobs/{job_id}")
+async def get_sync_job(job_id: str, current_user: dict = Depends(get_current_user)):
+    """Get the status of a sync job"""
+    job = await sync_scheduler.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Sync job not found")
+    
+    return job
+
+@api_router.post("/sync/rollback")
+async def rollback_sync(current_user: dict = Depends(get_current_user)):
+    """Switch back to the previous generation of employees and attendance logs"""
+    if current_user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    if not await sync_scheduler.acquire_exclusive("rollback"):
+        raise HTTPException(status_code=409, detail="A sync is running, try again when it has finished")
+    
     try:
-        employees = await sheets_service.sync_data_from_google_sheets()
-        return {
-            "message": f"Successfully synced {len(employees)} employees",
-            "employees_count": len(employees)
-        }
-    except Exception as e:
-        logger.error(f"Error syncing Google Sheets data: {e}")
-        raise HTTPException(status_code=500, detail="Failed to sync data")
+        active = await db.rollback_generation()
+        # The sync bookmarks describe the generation we just left; force the next sync to re-diff
+        await clear_sync_bookmarks()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        await sync_scheduler.release_exclusive()
+    
+    return {"message": "Rolled back to the previous generation", "active": active}
 
 @api_router.get("/sync/status")
 async def get_sync_status(current_user: dict = Depends(get_current_user)):
     """Get sync status"""
     attendance_logs_count = await db.attendance_logs.count_documents({})
     employees_count = await db.employees.count_documents({})
-    
-    # Get latest sync time (approximate)
-    latest_log = await db.attendance_logs.find_one({}, sort=[("created_at", -1)])
-    last_sync = latest_log.get("created_at") if latest_log else None
+    scheduler_status = await sync_scheduler.get_status()
+    generations = await db.refresh_generations()
     
     return {
         "attendance_logs_count": attendance_logs_count,
         "employees_count": employees_count,
-        "last_sync": last_sync,
+        **scheduler_status,
+        "generation": generations.get("generation", 0),
+        "previous_generation_available": bool(generations.get("previous")),
         "sheet_url": sheets_service.SHEET_URL
     }
 
+@api_router.get("/admin/metrics")
+async def get_metrics(current_user: dict = Depends(get_current_user)):
+    """Runtime metrics of in-process pools and caches (admin only)"""
+    if current_user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    return {"password_hashing": password_hasher.stats(), "response_cache": response_cache.stats()}
+
+@api_router.get("/admin/indexes")
+async def get_index_usage(current_user: dict = Depends(get_current_user)):
+    """Index usage statistics for every registered collection (admin only)"""
+    if current_user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    try:
+        return await get_index_stats()
+    except Exception as e:
+        logger.error(f"Error reading index stats: {e}")
+        raise HTTPException(status_code=500, detail="Failed to read index statistics")
+
 # Include API routes
 app.include_router(api_router)
 
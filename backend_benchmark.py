@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+Performance Benchmarks for the Employee Management System Backend
+Runs the hot paths of backend/server.py against synthetic data and reports throughput
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import httpx
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+# Benchmarks that touch MongoDB drop and rebuild collections, so they must never run
+# against the application database: DB_NAME is always overridden, never inherited
+APP_DB_NAME = os.environ.get("DB_NAME", "employee_management")
+BENCHMARK_DB_NAME = os.environ.get("BENCHMARK_DB_NAME", "employee_management_benchmark")
+if BENCHMARK_DB_NAME == APP_DB_NAME:
+    sys.exit(f"Refusing to benchmark against the application database {APP_DB_NAME!r}; "
+             f"set BENCHMARK_DB_NAME to a scratch database")
+os.environ["DB_NAME"] = BENCHMARK_DB_NAME
+
+from backend.server import (  # noqa: E402
+    sheets_service, build_ingest_source, pq, _frame_to_documents, client, db, ensure_indexes,
+    compute_attendance_stats, compute_attendance_logs_stats, SYNC_BATCH_SIZE,
+    app, password_hasher, get_password_hash, verify_password, parse_punch_time,
+    punch_frame, compute_daily_attendance, _count_cache,
+)
+from tests.attendance_reference import ScalarAttendance, strptime_seconds  # noqa: E402
+
+
+def generate_sheet(rows, users=2000, days=30, seed=42):
+    """Build a synthetic sheet export (all columns as text, like the chunked reader)"""
+    rng = np.random.default_rng(seed)
+    day_offsets = rng.integers(0, days, rows)
+    seconds = rng.integers(0, 86400, rows)
+    dates = (pd.Timestamp("2024-01-01") + pd.to_timedelta(day_offsets, unit="D"))
+    punch_times = dates + pd.to_timedelta(seconds, unit="s")
+
+    return pd.DataFrame({
+        "DeviceLogId": np.arange(1, rows + 1).astype(str),
+        "DownloadDate": dates.strftime("%m/%d/%Y"),
+        "DeviceId": rng.integers(22, 35, rows).astype(str),
+        "UserId": np.char.zfill(rng.integers(0, users, rows).astype(str), 8),
+        "LogDate": punch_times.strftime("%I:%M:%S %p"),
+        "Direction": "",
+        "AttDirection": "",
+        "C1": np.where(rng.random(rows) < 0.5, "in", "out"),
+        "WorkCode": "0",
+        "Longitude": "",
+        "Latitude": "",
+        "IsApproved": np.where(rng.random(rows) < 0.9, "1", ""),
+        "CreatedDate": punch_times.strftime("%m/%d/%Y %I:%M:%S %p"),
+        "LastModifiedDate": punch_times.strftime("%m/%d/%Y %I:%M:%S %p"),
+        "LocationAddress": "",
+        "BodyTemperature": "0.0",
+        "IsMaskOn": "0",
+    })
+
+
+def legacy_transform(df):
+    """The original per-row conversion loop (df.iterrows + dict building)"""
+    logs = []
+    for index, row in df.iterrows():
+        logs.append({
+            "id": str(uuid.uuid4()),
+            "device_log_id": str(row.get("DeviceLogId", "")),
+            "download_date": str(row.get("DownloadDate", "")),
+            "device_id": str(row.get("DeviceId", "")),
+            "user_id": str(row.get("UserId", "")),
+            "log_date": str(row.get("LogDate", "")),
+            "direction": str(row.get("Direction", "")),
+            "att_direction": str(row.get("AttDirection", "")),
+            "c1": str(row.get("C1", "")),
+            "work_code": str(row.get("WorkCode", "")),
+            "longitude": str(row.get("Longitude", "")),
+            "latitude": str(row.get("Latitude", "")),
+            "is_approved": int(float(row.get("IsApproved") or -1)),
+            "created_date": str(row.get("CreatedDate", "")),
+            "last_modified_date": str(row.get("LastModifiedDate", "")),
+            "location_address": str(row.get("LocationAddress", "")),
+            "body_temperature": float(row.get("BodyTemperature", 0.0)),
+            "is_mask_on": int(row.get("IsMaskOn", 0)),
+            "created_at": datetime.now(),
+            "updated_at": datetime.now()
+        })
+    return logs
+
+
+async def legacy_attendance_stats():
+    """The original /stats/attendance queries: three separate counts"""
+    total = await db.employees.count_documents({})
+    present = await db.employees.count_documents({"attendance_status": "Present"})
+    absent = await db.employees.count_documents({"attendance_status": "Absent"})
+    return {"total_employees": total, "present": present, "absent": absent}
+
+
+async def legacy_attendance_logs_stats():
+    """The original /attendance-logs/stats queries: four counts and two distincts"""
+    yesterday = datetime.now() - timedelta(days=1)
+    return {
+        "total_logs": await db.attendance_logs.count_documents({}),
+        "unique_users": len(await db.attendance_logs.distinct("user_id")),
+        "unique_devices": len(await db.attendance_logs.distinct("device_id")),
+        "in_logs": await db.attendance_logs.count_documents({"c1": "in"}),
+        "out_logs": await db.attendance_logs.count_documents({"c1": "out"}),
+        "recent_logs": await db.attendance_logs.count_documents({"created_at": {"$gte": yesterday}}),
+    }
+
+
+async def load_benchmark_data(df, chunk_rows=100_000):
+    """Replace attendance_logs/employees in the benchmark DB with the synthetic sheet"""
+    await db.attendance_logs.drop()
+    await db.employees.drop()
+    for start in range(0, len(df), chunk_rows):
+        documents = _frame_to_documents(sheets_service._transform_chunk(df.iloc[start:start + chunk_rows]))
+        for batch_start in range(0, len(documents), SYNC_BATCH_SIZE):
+            await db.attendance_logs.insert_many(documents[batch_start:batch_start + SYNC_BATCH_SIZE])
+
+    rng = np.random.default_rng(7)
+    user_ids = df["UserId"].unique()
+    statuses = np.where(rng.random(len(user_ids)) < 0.8, "Present", "Absent")
+    await db.employees.insert_many([
+        {"id": str(uuid.uuid4()), "employee_id": user_id, "attendance_status": status}
+        for user_id, status in zip(user_ids.tolist(), statuses.tolist())
+    ])
+    await ensure_indexes()
+
+
+async def server_counters():
+    """Commands run and documents/keys scanned so far, from serverStatus"""
+    server_status = await client.admin.command("serverStatus")
+    executor = server_status["metrics"]["queryExecutor"]
+    return server_status["opcounters"]["command"], executor["scannedObjects"], executor["scanned"]
+
+
+async def probe_latencies(http, stop, interval=0.01):
+    """Hit /healthz every ``interval`` seconds until ``stop`` is set.
+    
+    Latency counts from when the request was due, so time spent waiting for a
+    blocked event loop is included; returns milliseconds.
+    """
+    latencies = []
+    while not stop.is_set():
+        due = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        await http.get("/healthz")
+        latencies.append((time.perf_counter() - due) * 1000)
+    return latencies
+
+
+class BackendBenchmark:
+    def __init__(self, rows):
+        self.rows = rows
+        self.results = []
+
+    def log_result(self, name, seconds, rows, details=None):
+        """Log a benchmark result"""
+        rate = rows / seconds if seconds > 0 else float("inf")
+        print(f"⏱  {name}: {seconds:.2f}s for {rows:,} rows ({rate:,.0f} rows/sec)")
+        if details:
+            print(f"   Details: {details}")
+
+        self.results.append({"benchmark": name, "seconds": seconds, "rows": rows, "rows_per_sec": rate})
+        return rate
+
+    def benchmark_row_transform(self):
+        """Sheet rows -> attendance log documents: iterrows loop vs column-wise transform"""
+        print(f"\n📊 Row transformation ({self.rows:,} synthetic rows)")
+        df = generate_sheet(self.rows)
+
+        started = time.perf_counter()
+        legacy = legacy_transform(df)
+        legacy_rate = self.log_result("Legacy iterrows transform", time.perf_counter() - started, len(legacy))
+        del legacy
+
+        started = time.perf_counter()
+        documents = _frame_to_documents(sheets_service._transform_chunk(df))
+        vectorized_rate = self.log_result("Vectorized transform", time.perf_counter() - started, len(documents))
+
+        print(f"   Speedup: {vectorized_rate / legacy_rate:.1f}x")
+
+    def benchmark_punch_times(self):
+        """Punch time parsing: datetime.strptime vs memoized parse_punch_time, alone and in per-day working hours"""
+        print(f"\n📊 Punch time parsing ({self.rows:,} synthetic punches)")
+        df = generate_sheet(self.rows)
+        log_dates = df["LogDate"].tolist()
+
+        started = time.perf_counter()
+        expected = [strptime_seconds(log_date) for log_date in log_dates]
+        legacy_rate = self.log_result("datetime.strptime", time.perf_counter() - started, len(log_dates))
+
+        parse_punch_time.cache_clear()
+        started = time.perf_counter()
+        parsed = [parse_punch_time(log_date) for log_date in log_dates]
+        parser_rate = self.log_result("parse_punch_time", time.perf_counter() - started, len(log_dates),
+                                      parse_punch_time.cache_info())
+        assert parsed == expected, "parse_punch_time disagrees with strptime"
+        print(f"   Speedup: {parser_rate / legacy_rate:.1f}x")
+
+    def benchmark_attendance_engine(self):
+        """Per-(user, day) attendance: scalar functions per group vs one compute_daily_attendance pass"""
+        print(f"\n📊 Attendance engine ({self.rows:,} synthetic punches)")
+        df = generate_sheet(self.rows)
+        # Documents without punch_seconds, as stored before the field existed
+        logs = pd.DataFrame({
+            "user_id": df["UserId"], "day": df["DownloadDate"], "log_date": df["LogDate"],
+            "c1": df["C1"], "device_id": df["DeviceId"],
+        }).to_dict("records")
+
+        scalar = ScalarAttendance(sheets_service.device_locations)
+        started = time.perf_counter()
+        days = {}
+        for log in logs:
+            days.setdefault((log["user_id"], log["day"]), []).append(log)
+        expected = {key: (scalar.get_daily_punch_details(group), scalar.calculate_working_hours(group))
+                    for key, group in days.items()}
+        legacy_rate = self.log_result("Scalar functions per (user, day)", time.perf_counter() - started, len(expected))
+
+        parse_punch_time.cache_clear()
+        started = time.perf_counter()
+        summary, _ = compute_daily_attendance(punch_frame(logs))
+        engine_rate = self.log_result("compute_daily_attendance", time.perf_counter() - started, len(summary))
+        print(f"   Speedup: {engine_rate / legacy_rate:.1f}x")
+
+        fields = ["first_in", "last_out", "total_punches", "in_punches", "out_punches", "status"]
+        mismatches = 0
+        for row in summary[["user_id", "day", *fields, "working_hours", "total_hours"]].itertuples(index=False):
+            details, total_hours = expected[(row.user_id, row.day)]
+            if (any(getattr(row, field) != details[field] for field in fields)
+                    or round(row.working_hours, 2) != details["working_hours"] or abs(row.total_hours - total_hours) > 1e-9):
+                mismatches += 1
+        assert len(summary) == len(expected) and not mismatches, f"{mismatches} groups differ from the scalar functions"
+        print(f"   Cross-check: {len(summary):,} groups identical to the scalar functions")
+
+    def benchmark_file_ingest(self):
+        """Full ingest from local CSV / NDJSON / Parquet exports (needs MongoDB at MONGO_URL)"""
+        print(f"\n📊 Offline file ingest ({self.rows:,} synthetic rows, DB {os.environ['DB_NAME']})")
+        df = generate_sheet(self.rows)
+
+        with tempfile.TemporaryDirectory() as workdir:
+            paths = {"csv": Path(workdir) / "punches.csv", "ndjson": Path(workdir) / "punches.ndjson"}
+            df.to_csv(paths["csv"], index=False)
+            df.to_json(paths["ndjson"], orient="records", lines=True)
+            if pq is not None:
+                paths["parquet"] = Path(workdir) / "punches.parquet"
+                df.to_parquet(paths["parquet"], index=False)
+
+            async def ingest_all():
+                # One event loop for every run: the Motor client binds to the first loop it sees
+                return {fmt: await sheets_service.run_ingest(build_ingest_source(str(path)), mode="full")
+                        for fmt, path in paths.items()}
+
+            for fmt, result in asyncio.run(ingest_all()).items():
+                if result["status"] != "success":
+                    print(f"❌ {fmt} ingest failed: {result['error']}")
+                    continue
+                self.log_result(f"{fmt.upper()} file ingest", result["duration_seconds"], result["logs_count"], result["phases"])
+
+
+    def benchmark_stats_queries(self, repeats=5):
+        """Stats endpoints: separate counts/distincts vs $facet aggregations (needs MongoDB at MONGO_URL)"""
+        print(f"\n📊 Stats queries ({self.rows:,} synthetic logs, DB {os.environ['DB_NAME']})")
+        df = generate_sheet(self.rows)
+
+        async def uncached_attendance_logs_stats():
+            # Time the distinct counts themselves, not count_distinct's per-data-version cache
+            _count_cache.clear()
+            return await compute_attendance_logs_stats()
+
+        variants = [
+            ("Legacy /stats/attendance", legacy_attendance_stats),
+            ("$facet /stats/attendance", compute_attendance_stats),
+            ("Legacy /attendance-logs/stats", legacy_attendance_logs_stats),
+            ("$facet + indexed distincts /attendance-logs/stats", uncached_attendance_logs_stats),
+        ]
+
+        async def run_all():
+            await load_benchmark_data(df)
+            measured = []
+            for name, query in variants:
+                await query()  # warm up caches
+                commands_before, objects_before, keys_before = await server_counters()
+                started = time.perf_counter()
+                for _ in range(repeats):
+                    result = await query()
+                seconds = (time.perf_counter() - started) / repeats
+                commands_after, objects_after, keys_after = await server_counters()
+                measured.append((name, seconds, {
+                    # the second serverStatus call is counted too
+                    "round_trips": (commands_after - commands_before - 1) / repeats,
+                    "docs_scanned": (objects_after - objects_before) / repeats,
+                    "keys_scanned": (keys_after - keys_before) / repeats,
+                    "result": {k: v for k, v in result.items() if k != "device_locations"},
+                }))
+            return measured
+
+        for name, seconds, details in asyncio.run(run_all()):
+            self.log_result(name, seconds, self.rows, details)
+
+
+    def benchmark_login_storm(self, logins=100):
+        """/healthz latency while a burst of logins runs: bcrypt on the loop vs in the pool (needs MongoDB at MONGO_URL)"""
+        print(f"\n📊 Login storm ({logins} concurrent logins, {password_hasher.workers} hash workers)")
+        username, password = "benchmark-user", "benchmark-password"
+
+        async def legacy_login(http):
+            # The original handler: user lookup, then bcrypt inline on the event loop
+            user = await db.users.find_one({"username": username})
+            return verify_password(password, user["password"])
+
+        async def pooled_login(http):
+            response = await http.post("/api/auth/login", json={"username": username, "password": password})
+            return response.status_code == 200
+
+        async def run_all():
+            await db.users.delete_many({"username": username})
+            await db.users.insert_one({"id": str(uuid.uuid4()), "username": username, "role": "user",
+                                       "password": get_password_hash(password), "created_at": datetime.now()})
+            measured = []
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as http:
+                for name, login in (("bcrypt on event loop", legacy_login), ("bcrypt in pool", pooled_login)):
+                    stop = asyncio.Event()
+                    probe = asyncio.create_task(probe_latencies(http, stop))
+                    await asyncio.sleep(0.1)
+                    started = time.perf_counter()
+                    outcomes = await asyncio.gather(*(login(http) for _ in range(logins)))
+                    seconds = time.perf_counter() - started
+                    stop.set()
+                    latencies = np.array(await probe)
+                    measured.append((name, seconds, {
+                        "succeeded": sum(bool(outcome) for outcome in outcomes),
+                        "healthz_p50_ms": round(float(np.percentile(latencies, 50)), 2),
+                        "healthz_p99_ms": round(float(np.percentile(latencies, 99)), 2),
+                        "healthz_max_ms": round(float(latencies.max()), 2),
+                    }))
+            await db.users.delete_many({"username": username})
+            measured[-1][2]["hasher"] = password_hasher.stats()
+            return measured
+
+        for name, seconds, details in asyncio.run(run_all()):
+            rate = self.log_result(f"Login storm, {name}", seconds, logins, details)
+            print(f"   {rate:,.1f} logins/sec")
+
+
+BENCHMARKS = {
+    "transform": "benchmark_row_transform",
+    "punch_times": "benchmark_punch_times",
+    "attendance": "benchmark_attendance_engine",
+    "ingest": "benchmark_file_ingest",
+    "stats": "benchmark_stats_queries",
+    "login": "benchmark_login_storm",
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backend performance benchmarks")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="synthetic sheet size")
+    parser.add_argument("--only", choices=sorted(BENCHMARKS), action="append", help="run selected benchmarks only")
+    args = parser.parse_args()
+
+    benchmark = BackendBenchmark(args.rows)
+    for name in args.only or BENCHMARKS:
+        getattr(benchmark, BENCHMARKS[name])()
+
+
+if __name__ == "__main__":
+    main()
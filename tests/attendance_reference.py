@@ -0,0 +1,126 @@
+"""Scalar per-day attendance logic as it was before the columnar engine (backend.server.compute_daily_attendance).
+
+The parity tests and backend_benchmark.py both check the engine and the
+GoogleSheetsService wrappers against this one reference. Apart from parsing
+times with datetime.strptime, it is the pre-engine code unchanged.
+"""
+
+from datetime import datetime
+
+
+def strptime_seconds(log_date):
+    """The original punch time parse: datetime.strptime on every call"""
+    try:
+        punch_time = datetime.strptime(log_date.strip(), "%I:%M:%S %p")
+    except (AttributeError, ValueError):
+        return None
+    return punch_time.hour * 3600 + punch_time.minute * 60 + punch_time.second
+
+
+def _seconds_of_day(log):
+    seconds = log.get("punch_seconds")
+    if seconds is None:
+        seconds = strptime_seconds(log.get("log_date"))
+    return seconds
+
+
+def _punch_order(log):
+    seconds = _seconds_of_day(log)
+    return -1 if seconds is None else seconds
+
+
+class ScalarAttendance:
+    """The per-(user, day) methods of GoogleSheetsService, one list of logs at a time"""
+
+    def __init__(self, device_locations):
+        self.device_locations = device_locations
+
+    def get_device_location(self, device_id):
+        return self.device_locations.get(device_id, f"Location {device_id}")
+
+    def get_daily_punch_details(self, logs_for_day):
+        if not logs_for_day:
+            return {
+                "first_in": None,
+                "last_out": None,
+                "total_punches": 0,
+                "punch_details": [],
+                "working_hours": 0.0,
+                "status": "Absent"
+            }
+
+        logs_for_day.sort(key=_punch_order)
+
+        in_punches = [log for log in logs_for_day if log.get('c1', '').lower() == 'in']
+        out_punches = [log for log in logs_for_day if log.get('c1', '').lower() == 'out']
+        first_in = in_punches[0] if in_punches else None
+        last_out = out_punches[-1] if out_punches else None
+
+        punch_details = []
+        for log in logs_for_day:
+            punch_details.append({
+                "time": log.get('log_date', ''),
+                "type": log.get('c1', '').upper(),
+                "device_id": log.get('device_id', ''),
+                "location": self.get_device_location(log.get('device_id', ''))
+            })
+
+        working_hours = 0.0
+        if first_in and last_out:
+            working_hours = self.calculate_working_hours_in_out(first_in, last_out)
+        elif first_in and not last_out:
+            working_hours = self.calculate_working_hours([first_in, logs_for_day[-1]])
+
+        status = self.calculate_attendance_status(logs_for_day)
+
+        return {
+            "first_in": first_in.get('log_date', '') if first_in else None,
+            "last_out": last_out.get('log_date', '') if last_out else None,
+            "total_punches": len(logs_for_day),
+            "in_punches": len(in_punches),
+            "out_punches": len(out_punches),
+            "punch_details": punch_details,
+            "working_hours": round(working_hours, 2),
+            "status": status
+        }
+
+    def calculate_working_hours_in_out(self, first_in, last_out):
+        first_seconds = _seconds_of_day(first_in)
+        last_seconds = _seconds_of_day(last_out)
+        if first_seconds is None or last_seconds is None:
+            return 0.0
+
+        hours = (last_seconds - first_seconds) / 3600
+        if hours < 0:
+            hours += 24
+        if hours > 5:
+            hours -= 1
+        return max(0, hours)
+
+    def calculate_attendance_status(self, logs_for_day):
+        if not logs_for_day:
+            return "Absent"
+
+        logs_for_day.sort(key=_punch_order)
+        in_punches = [log for log in logs_for_day if log.get('c1', '').lower() == 'in']
+        if in_punches:
+            return "Present"
+        # Only OUT punches: lenient, any activity counts as Present
+        return "Present" if logs_for_day else "Absent"
+
+    def calculate_working_hours(self, logs_for_day):
+        if not logs_for_day or len(logs_for_day) < 2:
+            return 0.0
+
+        logs_for_day.sort(key=_punch_order)
+        first_seconds = _seconds_of_day(logs_for_day[0])
+        last_seconds = _seconds_of_day(logs_for_day[-1])
+        if first_seconds is None or last_seconds is None:
+            return 0.0
+
+        hours = (last_seconds - first_seconds) / 3600
+        if hours < 0:
+            hours += 24
+        if hours > 5:
+            hours -= 1
+        return max(0, hours)
@@ -0,0 +1,106 @@
+"""Parity of the columnar attendance engine and its GoogleSheetsService wrappers with the scalar reference"""
+
+import copy
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from backend.server import compute_daily_attendance, punch_frame, sheets_service  # noqa: E402
+from tests.attendance_reference import ScalarAttendance  # noqa: E402
+
+scalar = ScalarAttendance(sheets_service.device_locations)
+
+
+def punches(*rows):
+    return [{"user_id": "00000001", "day": "2024-01-01", "punch_seconds": None, "log_date": log_date, "c1": c1,
+             "device_id": device_id} for log_date, c1, device_id in rows]
+
+
+CASES = {
+    "day_shift": punches(("09:00:00 AM", "in", "22"), ("12:30:00 PM", "out", "22"),
+                         ("01:15:00 PM", "in", "23"), ("06:05:00 PM", "out", "23")),
+    "out_of_order": punches(("06:05:00 PM", "out", "23"), ("09:00:00 AM", "in", "22"), ("12:30:00 PM", "in", "24")),
+    "overnight": punches(("02:00:00 AM", "out", "22"), ("10:00:00 PM", "in", "22")),
+    "no_out": punches(("08:00:00 AM", "in", "22"), ("11:00:00 AM", "in", "22"), ("03:30:00 PM", "", "30")),
+    "no_in": punches(("08:00:00 AM", "out", "22"), ("05:00:00 PM", "out", "22")),
+    "unparseable_times": punches(("25:61:00 PM", "in", "22"), ("not a time", "out", "22"), ("05:00:00 PM", "out", "22")),
+    "unparseable_in": punches(("", "in", "22"), ("09:00:00 AM", "out", "22")),
+    "mixed_case_directions": punches(("08:45:10 AM", "IN", "22"), ("01:00:00 PM", "Out", "25"), ("05:20:30 PM", "oUt", "25")),
+    "same_time": punches(("09:00:00 AM", "in", "22"), ("09:00:00 AM", "in", "31"), ("09:00:00 AM", "out", "34")),
+    "unknown_device": punches(("09:00:00 AM", "in", "99"), ("05:00:00 PM", "out", "")),
+    "single_punch": punches(("07:59:59 AM", "in", "22")),
+}
+
+
+@pytest.mark.parametrize("name", sorted(CASES))
+def test_engine_matches_reference(name):
+    logs = CASES[name]
+    summary, _ = compute_daily_attendance(punch_frame(logs))
+    expected = scalar.get_daily_punch_details(copy.deepcopy(logs))
+
+    assert len(summary) == 1
+    row = summary.iloc[0]
+    for field in ("first_in", "last_out", "total_punches", "in_punches", "out_punches", "status"):
+        assert row[field] == expected[field], field
+    assert round(row["working_hours"], 2) == expected["working_hours"]
+    assert row["total_hours"] == pytest.approx(scalar.calculate_working_hours(copy.deepcopy(logs)))
+
+
+@pytest.mark.parametrize("name", sorted(CASES))
+def test_punch_details_match_reference(name):
+    logs = CASES[name]
+    # Includes punch_details: chronological order (stable for equal times) and device locations
+    assert sheets_service.get_daily_punch_details(copy.deepcopy(logs)) == scalar.get_daily_punch_details(copy.deepcopy(logs))
+
+
+@pytest.mark.parametrize("name", sorted(CASES))
+def test_scalar_wrappers_match_reference(name):
+    logs = CASES[name]
+    assert sheets_service.calculate_attendance_status(copy.deepcopy(logs)) == scalar.calculate_attendance_status(copy.deepcopy(logs))
+    assert sheets_service.calculate_working_hours(copy.deepcopy(logs)) == pytest.approx(
+        scalar.calculate_working_hours(copy.deepcopy(logs)))
+    first, last = logs[0], logs[-1]
+    assert sheets_service.calculate_working_hours_in_out(first, last) == pytest.approx(
+        scalar.calculate_working_hours_in_out(first, last))
+
+
+def test_wrappers_on_empty_input():
+    assert sheets_service.get_daily_punch_details([]) == scalar.get_daily_punch_details([])
+    assert sheets_service.calculate_attendance_status([]) == "Absent"
+    assert sheets_service.calculate_working_hours([]) == 0.0
+
+
+def test_wrappers_on_a_single_log():
+    logs = CASES["single_punch"]
+    details = sheets_service.get_daily_punch_details(copy.deepcopy(logs))
+    assert details == scalar.get_daily_punch_details(copy.deepcopy(logs))
+    assert details["punch_details"] == [{"time": "07:59:59 AM", "type": "IN", "device_id": "22", "location": "Main Office"}]
+    assert details["working_hours"] == 0.0
+    assert sheets_service.calculate_working_hours(copy.deepcopy(logs)) == 0.0
+    assert sheets_service.calculate_attendance_status(copy.deepcopy(logs)) == "Present"
+
+
+def test_punch_details_are_chronological_with_locations():
+    details = sheets_service.get_daily_punch_details(copy.deepcopy(CASES["out_of_order"]))
+    assert [(punch["time"], punch["type"], punch["location"]) for punch in details["punch_details"]] == [
+        ("09:00:00 AM", "IN", "Main Office"), ("12:30:00 PM", "IN", "Branch B"), ("06:05:00 PM", "OUT", "Branch A"),
+    ]
+
+
+def test_days_and_users_are_summarized_separately():
+    logs = [dict(log, user_id=user, day=day)
+            for user in ("00000001", "00000002") for day in ("2024-01-01", "2024-01-02")
+            for log in CASES["day_shift"]]
+    summary, ordered = compute_daily_attendance(punch_frame(logs))
+
+    assert list(zip(summary["user_id"], summary["day"])) == [
+        ("00000001", "2024-01-01"), ("00000001", "2024-01-02"),
+        ("00000002", "2024-01-01"), ("00000002", "2024-01-02"),
+    ]
+    assert (summary["stop"] - summary["start"]).tolist() == [4, 4, 4, 4]
+    assert len(ordered) == len(logs)
+    expected = scalar.get_daily_punch_details(copy.deepcopy(CASES["day_shift"]))["working_hours"]
+    assert summary["working_hours"].round(2).tolist() == [expected] * 4